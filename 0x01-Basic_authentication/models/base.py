@@ -5,16 +5,22 @@ import json
 import uuid
 from os import path
 from datetime import datetime
+from itertools import count
 from typing import TypeVar, List, Iterable
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+POSITIONS = count()
+UNSAVED = {}
 
 
 class Base():
     """Base class.
     """
+    indexed_attributes = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a Base instance.
@@ -44,6 +50,18 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def __setattr__(self, name: str, value):
+        """Set an attribute. A stored object whose indexed attribute
+        changes is searched outside of the indexes until its next save.
+        """
+        object.__setattr__(self, name, value)
+        if name in self.indexed_attributes:
+            s_class = self.__class__.__name__
+            values = INDEXED_VALUES.get(s_class, {}).get(self.id)
+            if values is not None and values.get(name) != value and \
+                    DATA[s_class].get(self.id) is self:
+                UNSAVED[s_class].add(self.id)
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """Convert the object a JSON dictionary.
         """
@@ -71,6 +89,7 @@ class Base():
             objs_json = json.load(f)
             for obj_id, obj_json in objs_json.items():
                 DATA[s_class][obj_id] = cls(**obj_json)
+        cls.build_indexes()
 
     @classmethod
     def save_to_file(cls):
@@ -91,6 +110,7 @@ class Base():
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
         DATA[s_class][self.id] = self
+        self.__class__._index_object(self)
         self.__class__.save_to_file()
 
     def remove(self):
@@ -99,8 +119,94 @@ class Base():
         s_class = self.__class__.__name__
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
+            self.__class__._unindex_object(self.id)
             self.__class__.save_to_file()
 
+    @classmethod
+    def build_indexes(cls):
+        """Rebuild the attribute indexes from the loaded objects.
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {k: {} for k in cls.indexed_attributes}
+        INDEXED_VALUES[s_class] = {}
+        UNSAVED[s_class] = set()
+        for obj in DATA.get(s_class, {}).values():
+            cls._index_object(obj)
+
+    @classmethod
+    def _index_object(cls, obj: TypeVar('Base')):
+        """Add (or refresh) the index entries of an object.
+        """
+        if len(cls.indexed_attributes) == 0:
+            return
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            cls.build_indexes()
+        values = INDEXED_VALUES[s_class].get(obj.id)
+        # the place of the object in DATA, kept until it is removed
+        if values is not None:
+            values = {'_position': values['_position']}
+        else:
+            values = {'_position': next(POSITIONS)}
+        cls._unindex_object(obj.id)
+        for k in cls.indexed_attributes:
+            v = getattr(obj, k, None)
+            try:
+                INDEXES[s_class][k].setdefault(v, {})[obj.id] = None
+            except TypeError:
+                continue
+            values[k] = v
+        INDEXED_VALUES[s_class][obj.id] = values
+
+    @classmethod
+    def _unindex_object(cls, obj_id: str):
+        """Drop the index entries of an object.
+        """
+        s_class = cls.__name__
+        UNSAVED.get(s_class, set()).discard(obj_id)
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        for k, v in values.items():
+            if k not in INDEXES[s_class]:
+                continue
+            bucket = INDEXES[s_class][k].get(v)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 0:
+                del INDEXES[s_class][k][v]
+
+    @classmethod
+    def _index_candidates(cls, attributes: dict) -> List[str]:
+        """Return the IDs matching the most selective indexed
+        attribute of the query, with the objects changed since their
+        save, in DATA order; or None if no index applies.
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            return None
+        candidates = None
+        for k, v in attributes.items():
+            if indexes.get(k) is None:
+                continue
+            try:
+                bucket = indexes[k].get(v, {})
+            except TypeError:
+                continue
+            if candidates is None or len(bucket) < len(candidates):
+                candidates = bucket
+        if candidates is None:
+            return None
+        unsaved = UNSAVED.get(s_class)
+        if unsaved:
+            candidates = candidates.keys() | unsaved
+        if len(candidates) < 2:
+            return list(candidates)
+        values = INDEXED_VALUES[s_class]
+        return sorted(candidates, key=lambda k: values[k]['_position'])
+
     @classmethod
     def count(cls) -> int:
         """Count all objects.
@@ -134,4 +240,8 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        objs = DATA[s_class]
+        candidates = cls._index_candidates(attributes)
+        if candidates is not None:
+            objs = {k: objs[k] for k in candidates if k in objs}
+        return list(filter(_search, objs.values()))
@@ -6,11 +6,13 @@ from flask import Flask, jsonify, abort, request
 from flask_cors import CORS, cross_origin
 
 from api.v1.views import app_views
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, compile_excluded_paths
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.session_db_auth import SessionDBAuth
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_shared_auth import SessionSharedAuth
+from api.v1.auth.session_token_auth import SessionTokenAuth
 
 
 # Create the Flask application
@@ -18,7 +20,8 @@ app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth_types = ['auth', 'basic_auth', 'session_auth',
-              'session_exp_auth', 'session_db_auth']
+              'session_exp_auth', 'session_db_auth',
+              'session_shared_auth', 'session_token_auth']
 auth_type = getenv('AUTH_TYPE', 'auth')
 i = 0
 auth = None
@@ -37,9 +40,32 @@ while i < len(auth_types) and auth is None:
             auth = SessionExpAuth()
         elif auth_types[i] == 'session_db_auth':
             auth = SessionDBAuth()
+        elif auth_types[i] == 'session_shared_auth':
+            auth = SessionSharedAuth()
+        elif auth_types[i] == 'session_token_auth':
+            auth = SessionTokenAuth()
     i += 1
 
 
+# Paths served without authentication: the defaults, then the paths
+# of AUTH_EXCLUDED_PATHS (comma-separated) and AUTH_EXCLUDED_PATHS_FILE
+# (one per line, # for comments), compiled once into one matcher
+excluded_paths = [
+    "/api/v1/status/",
+    "/api/v1/unauthorized/",
+    "/api/v1/forbidden/",
+    "/api/v1/auth_session/login/",
+]
+excluded_paths += [p for p in getenv('AUTH_EXCLUDED_PATHS', '').split(',')
+                   if len(p.strip()) > 0]
+if getenv('AUTH_EXCLUDED_PATHS_FILE'):
+    with open(getenv('AUTH_EXCLUDED_PATHS_FILE'), 'r') as f:
+        excluded_paths += [line for line in f
+                           if len(line.strip()) > 0 and
+                           not line.strip().startswith('#')]
+excluded_paths_matcher = compile_excluded_paths(excluded_paths)
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -64,18 +90,12 @@ def forbidden(error) -> str:
 def authenticate_user():
     """Authenticates the user before processing a request."""
     if auth:
-        excluded_paths = [
-            "/api/v1/status/",
-            "/api/v1/unauthorized/",
-            "/api/v1/forbidden/",
-            "/api/v1/auth_session/login/",
-        ]
-        if auth.require_auth(request.path, excluded_paths):
-            user = auth.current_user(request)
-            if auth.authorization_header(request) is None and \
-                    auth.session_cookie(request) is None:
-                abort(401)
+        if auth.require_auth(request.path, excluded_paths_matcher):
+            user = auth.authenticate(request)
             if user is None:
+                if auth.authorization_header(request) is None and \
+                        auth.session_cookie(request) is None:
+                    abort(401)
                 abort(403)
             request.current_user = user
 
@@ -2,47 +2,206 @@
 """this is an Authentication module for the API.
 """
 import os
-import re
-from typing import List, TypeVar
+from typing import List, TypeVar, Union
 from flask import request
 
 
+# read once, at import: SESSION_NAME is set before the API is imported
+SESSION_NAME = os.getenv('SESSION_NAME')
+_UNSET = object()
+# keys of the nodes of a PathTrie, never characters of a path
+_END = ''
+_ANY = None
+
+
+class AuthContext():
+    """Authentication state of one request, shared by the auth methods
+    and the views: the Authorization header, the session ID of the
+    cookie (read on first access), the user (once resolved), and the
+    mechanism that authenticated it.
+    Only built by the auths reading a session: Basic auth reads the
+    header alone, and builds none.
+    """
+    __slots__ = ('cookies', 'authorization_header', 'session_id', 'user',
+                 'mechanism')
+
+    def __init__(self, request):
+        """Initialize the AuthContext of a request from its
+        Authorization header. Only the cookies of the request are kept
+        (not the request, which holds the AuthContext).
+        """
+        self.cookies = request.cookies
+        self.authorization_header = request.headers.get('Authorization')
+        self.user = _UNSET
+        self.mechanism = None
+
+    def __getattr__(self, name: str):
+        """Read the session ID from the cookie, once: called while
+        its slot is not set.
+        """
+        if name != 'session_id':
+            raise AttributeError(name)
+        self.session_id = self.cookies.get(SESSION_NAME)
+        return self.session_id
+
+
+class PathTrie():
+    """Prefix trie of the excluded paths, matched along the path
+    whatever the number of paths. A node ends a path (_END) when every
+    path starting there is excluded; a '*' inside an excluded path is
+    a wildcard node (_ANY), matching any characters. Other nodes map
+    the next character to the run of characters shared by their
+    paths (their edge) and the node after it.
+    """
+    __slots__ = ('_root',)
+
+    def __init__(self, prefixes: List[str]):
+        """Initialize a PathTrie excluding the paths starting with
+        any of the prefixes.
+        """
+        root = {}
+        i = 0
+        while i < len(prefixes):
+            node = root
+            for char in prefixes[i]:
+                if _END in node:
+                    break
+                node = node.setdefault(_ANY if char == '*' else char, {})
+            node.clear()
+            node[_END] = True
+            i += 1
+        self._root = self._compress(root)
+
+    @classmethod
+    def _compress(cls, node: dict) -> dict:
+        """Return a node of single characters as a node of edges.
+        """
+        result = {}
+        for key, child in node.items():
+            if key == _END:
+                result[_END] = True
+            elif key is _ANY:
+                result[_ANY] = cls._compress(child)
+            else:
+                edge = key
+                while len(child) == 1:
+                    char = next(iter(child))
+                    if char == _END or char is _ANY:
+                        break
+                    edge += char
+                    child = child[char]
+                result[key] = (edge, cls._compress(child))
+        return result
+
+    def match(self, path: str) -> bool:
+        """Check that the path is excluded.
+        """
+        states = [(self._root, 0)]
+        while len(states) > 0:
+            node, i = states.pop()
+            while True:
+                if _END in node:
+                    return True
+                wildcard = node.get(_ANY)
+                if wildcard is not None:
+                    # the rest of the path after any number of characters
+                    j = len(path)
+                    while j >= i:
+                        states.append((wildcard, j))
+                        j -= 1
+                if i == len(path):
+                    break
+                edge = node.get(path[i])
+                if edge is None or not path.startswith(edge[0], i):
+                    break
+                i += len(edge[0])
+                node = edge[1]
+        return False
+
+
+def compile_excluded_paths(excluded_paths: List[str]) -> PathTrie:
+    """Compile excluded paths into the PathTrie of the paths any of
+    them excludes: 'p*', 'p/' and 'p' the paths starting with p.
+    """
+    prefixes = []
+    i = 0
+    while i < len(excluded_paths):
+        exclusion_path = excluded_paths[i].strip()
+        i += 1
+        if len(exclusion_path) == 0:
+            continue
+        if exclusion_path[-1] in ('*', '/'):
+            exclusion_path = exclusion_path[0:-1]
+        prefixes.append(exclusion_path)
+    return PathTrie(prefixes)
+
+
 class Auth:
     """Authentication class for managing user authentication.
+    The header, cookie and user of a request are kept in its
+    AuthContext (request.auth_context), so they are read once.
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    matchers = {}
+    mechanism = None
+
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathTrie]) -> bool:
         """Check if a given path requires authentication.
+        excluded_paths is a list of paths, compiled once per distinct
+        list, or the result of compile_excluded_paths.
         bool: True if the path requires authentication,
         False otherwise.
         """
         if path is None or excluded_paths is None:
             return True
 
-        i = 0
-        while i < len(excluded_paths):
-            exclusion_path = excluded_paths[i].strip()
-            pattern = ''
-            if exclusion_path[-1] == '*':
-                pattern = '{}.*'.format(exclusion_path[0:-1])
-            elif exclusion_path[-1] == '/':
-                pattern = '{}/*'.format(exclusion_path[0:-1])
-            else:
-                pattern = '{}/*'.format(exclusion_path)
-            if re.match(pattern, path):
-                return False
-            i += 1
+        matcher = excluded_paths
+        if type(excluded_paths) is not PathTrie:
+            key = tuple(excluded_paths)
+            matcher = Auth.matchers.get(key)
+            if matcher is None:
+                matcher = compile_excluded_paths(excluded_paths)
+                if len(Auth.matchers) >= 64:
+                    Auth.matchers.clear()
+                Auth.matchers[key] = matcher
+        if matcher.match(path):
+            return False
 
         return True
 
+    def context(self, request) -> AuthContext:
+        """Return the AuthContext of a request, created on first use.
+        """
+        context = getattr(request, 'auth_context', None)
+        if context is None:
+            context = request.auth_context = AuthContext(request)
+        return context
+
+    def authenticate(self, request=None) -> TypeVar('User'):
+        """Resolve the user of the request once, kept in
+        the AuthContext of the request, and return it.
+        """
+        context = getattr(request, 'auth_context', None)
+        if context is None:
+            context = request.auth_context = AuthContext(request)
+        if context.user is _UNSET:
+            context.user = self.current_user(request)
+            if context.user is not None:
+                context.mechanism = self.mechanism
+        return context.user
+
     def authorization_header(self, request=None) -> str:
         """Get the authorization header from the request.
         request: The request object containing the authorization
         header.str: The value of the authorization header,
         or None if not present.
         """
-        if request is not None:
+        if request is None:
+            return None
+        context = getattr(request, 'auth_context', None)
+        if context is None:
             return request.headers.get('Authorization', None)
-        return None
+        return context.authorization_header
 
     def current_user(self, request=None) -> TypeVar('User'):
         """Get the current user from the request.
@@ -57,6 +216,9 @@ class Auth:
         request: The request object containing the session cookie.
         str: The value of the session cookie, or None if not present.
         """
-        if request is not None:
-            cookie_name = os.getenv('SESSION_NAME')
-            return request.cookies.get(cookie_name)
+        if request is None:
+            return None
+        context = getattr(request, 'auth_context', None)
+        if context is None:
+            return request.cookies.get(SESSION_NAME)
+        return context.session_id
@@ -1,18 +1,48 @@
 #!/usr/bin/env python3
 """Basic authentication module for the API using while loops.
 """
+import os
 import re
 import base64
 import binascii
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
 from typing import Tuple, TypeVar
 
 from .auth import Auth
 from models.user import User
 
 
+try:
+    BASIC_AUTH_CACHE_SIZE = int(os.getenv('BASIC_AUTH_CACHE_SIZE', '10000'))
+except Exception:
+    BASIC_AUTH_CACHE_SIZE = 10000
+try:
+    BASIC_AUTH_CACHE_TTL = float(os.getenv('BASIC_AUTH_CACHE_TTL', '60'))
+except Exception:
+    BASIC_AUTH_CACHE_TTL = 60.0
+
+
 class BasicAuth(Auth):
     """Basic authentication class implemented with while loops.
+    Verified Authorization headers are cached for BASIC_AUTH_CACHE_TTL
+    seconds (at most BASIC_AUTH_CACHE_SIZE, least recently used out),
+    by a digest of the header keyed with a per-process secret, as
+    (user ID, email, password hash): a hit skips the parsing, the
+    email lookup and the password hash, and misses if the user was
+    removed or its email or password changed since.
     """
+    mechanism = 'basic'
+    verified = OrderedDict()
+    verified_lock = threading.Lock()
+    verified_key = os.urandom(32)
+    hits = 0
+    misses = 0
+    hit_seconds = 0.0
+    miss_seconds = 0.0
+
     def extract_base64_authorization_header(
             self,
             authorization_header: str) -> str:
@@ -76,21 +106,115 @@ class BasicAuth(Auth):
         result = None
         while type(user_email) == str and type(user_pwd) == str:
             try:
-                users = User.search({'email': user_email})
+                user = User.first({'email': user_email})
             except Exception:
                 break
-            while len(users) > 0:
-                if users[0].is_valid_password(user_pwd):
-                    result = users[0]
+            while user is not None:
+                if user.is_valid_password(user_pwd):
+                    result = user
                 break
             break
         return result
 
+    def _header_digest(self, authorization_header: str) -> bytes:
+        """Return the keyed digest of an Authorization header.
+        """
+        return blake2b(authorization_header.encode('utf-8'),
+                       key=BasicAuth.verified_key,
+                       digest_size=16).digest()
+
+    def _cached_user(self, authorization_header: str) -> TypeVar('User'):
+        """Return the user verified for this header, if cached
+        and still valid.
+        """
+        key = self._header_digest(authorization_header)
+        with BasicAuth.verified_lock:
+            entry = BasicAuth.verified.get(key)
+            if entry is not None:
+                BasicAuth.verified.move_to_end(key)
+        if entry is None:
+            return None
+        user_id, email, password, expires = entry
+        user = None
+        if expires >= time.monotonic():
+            user = User.get(user_id)
+        while user is None or user.email != email or \
+                user.password != password:
+            with BasicAuth.verified_lock:
+                BasicAuth.verified.pop(key, None)
+            return None
+        return user
+
+    def _cache_user(self, authorization_header: str, user: TypeVar('User')):
+        """Cache the user verified for this header.
+        """
+        key = self._header_digest(authorization_header)
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + BASIC_AUTH_CACHE_TTL)
+        with BasicAuth.verified_lock:
+            BasicAuth.verified[key] = entry
+            BasicAuth.verified.move_to_end(key)
+            while len(BasicAuth.verified) > BASIC_AUTH_CACHE_SIZE:
+                BasicAuth.verified.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """Return the size, hits, misses and hit rate of the credential
+        cache, the mean latency of a hit and of a miss, and the time
+        saved by the hits.
+        """
+        with BasicAuth.verified_lock:
+            size = len(BasicAuth.verified)
+            hits, misses = BasicAuth.hits, BasicAuth.misses
+            hit_seconds = BasicAuth.hit_seconds
+            miss_seconds = BasicAuth.miss_seconds
+        hit_latency = hit_seconds / hits if hits > 0 else 0.0
+        miss_latency = miss_seconds / misses if misses > 0 else 0.0
+        return {
+            'size': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses > 0 else 0.0,
+            'hit_latency_us': hit_latency * 1e6,
+            'miss_latency_us': miss_latency * 1e6,
+            'saved_seconds': max(0.0, hits * (miss_latency - hit_latency)),
+        }
+
+    def authenticate(self, request=None) -> TypeVar('User'):
+        """Return the user of the Authorization header of the request:
+        the header is all Basic auth reads, so no AuthContext is built.
+        """
+        if request is None:
+            return None
+        return self.user_from_header(request.headers.get('Authorization'))
+
     def current_user(self, request=None) -> TypeVar('User'):
         """Gets user from request using methods with while loops.
         """
-        auth_header = self.authorization_header(request)
+        return self.user_from_header(self.authorization_header(request))
+
+    def user_from_header(self, auth_header: str) -> TypeVar('User'):
+        """Gets the user of an Authorization header.
+        A verified header is served from the credential cache.
+        """
+        cached = isinstance(auth_header, str) and BASIC_AUTH_CACHE_SIZE > 0
+        start = time.perf_counter()
+        while cached:
+            user = self._cached_user(auth_header)
+            if user is None:
+                break
+            with BasicAuth.verified_lock:
+                BasicAuth.hits += 1
+                BasicAuth.hit_seconds += time.perf_counter() - start
+            return user
         b64_auth_token = self.extract_base64_authorization_header(auth_header)
         auth_token = self.decode_base64_authorization_header(b64_auth_token)
         email, password = self.extract_user_credentials(auth_token)
-        return self.user_object_from_credentials(email, password)
+        user = self.user_object_from_credentials(email, password)
+        while cached:
+            if user is not None:
+                self._cache_user(auth_header, user)
+            with BasicAuth.verified_lock:
+                BasicAuth.misses += 1
+                BasicAuth.miss_seconds += time.perf_counter() - start
+            break
+        return user
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Deny-list module for revoked session tokens.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from hashlib import blake2b
+
+from .session_store import SessionStore
+
+
+try:
+    DENY_LIST_REFRESH = float(os.getenv('DENY_LIST_REFRESH', '1'))
+except Exception:
+    DENY_LIST_REFRESH = 1.0
+
+
+class BloomFilter():
+    """Bloom filter of strings on a bit array: no false negatives,
+    and false positives at a rate set by its size and number of hashes.
+    """
+
+    def __init__(self, bits: int = 1 << 16, hashes: int = 4):
+        """Initialize an empty BloomFilter of a number of bits,
+        setting a number of bits per item.
+        """
+        self.bits = max(8, bits)
+        self.hashes = max(1, min(hashes, 16))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item: str) -> list:
+        """Return the bit positions of an item.
+        """
+        digest = blake2b(item.encode('utf-8'),
+                         digest_size=4 * self.hashes).digest()
+        return [int.from_bytes(digest[i:i + 4], 'little') % self.bits
+                for i in range(0, len(digest), 4)]
+
+    def add(self, item: str):
+        """Add an item.
+        """
+        for pos in self._positions(item):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        """Check that an item may have been added.
+        """
+        for pos in self._positions(item):
+            if not self._array[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class DenyList():
+    """Revoked token IDs, each until its token expires.
+    Lookups of IDs that were never revoked (almost every request)
+    stop at the bloom filter; its positives are confirmed in an
+    exact dict of token ID to expiration.
+    Expired token IDs are purged whenever the dict doubles in size.
+    """
+
+    def __init__(self, bits: int = 1 << 16, hashes: int = 4):
+        """Initialize an empty DenyList with a bloom filter of a
+        number of bits and hashes.
+        """
+        self._bits = bits
+        self._hashes = hashes
+        self._bloom = BloomFilter(bits, hashes)
+        self._expires = {}
+        self._lock = threading.Lock()
+        self._purge_at = 1024
+
+    def add(self, token_id: str, expires: int, user_id: str = None):
+        """Revoke a token ID until the time its token expires (seconds
+        since the epoch). The user ID is not kept.
+        """
+        with self._lock:
+            self._expires[token_id] = expires
+            self._bloom.add(token_id)
+            full = len(self._expires) >= self._purge_at
+        if full:
+            self.purge()
+
+    def __contains__(self, token_id: str) -> bool:
+        """Check that a token ID is revoked.
+        """
+        if token_id not in self._bloom:
+            return False
+        return token_id in self._expires
+
+    def purge(self, now: float = None) -> int:
+        """Forget the token IDs whose token expired at now (default:
+        the current time), and rebuild the bloom filter from the rest.
+        Return the number of token IDs forgotten.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            expires = {k: v for k, v in self._expires.items()
+                       if v >= now}
+            purged = len(self._expires) - len(expires)
+            if purged > 0:
+                bloom = BloomFilter(self._bits, self._hashes)
+                for token_id in expires:
+                    bloom.add(token_id)
+                self._expires = expires
+                self._bloom = bloom
+            self._purge_at = max(1024, 2 * len(expires))
+        return purged
+
+    def __len__(self) -> int:
+        """Count the revoked token IDs.
+        """
+        return len(self._expires)
+
+
+class SharedDenyList():
+    """Revoked token IDs kept in a session store shared by the
+    processes (see load_session_store), each until its token expires:
+    a token logged out in one worker is refused by all the others
+    within DENY_LIST_REFRESH seconds.
+    Lookups stop at a local bloom filter of the revoked IDs, rebuilt
+    from the store every DENY_LIST_REFRESH seconds (by one thread, the
+    others keep the current one); only its positives read the store.
+    IDs revoked in this process are added to it at once.
+    Expired IDs are deleted by the store (purged on each revocation).
+    """
+
+    def __init__(self, store: SessionStore, bits: int = 1 << 16,
+                 hashes: int = 4, refresh: float = DENY_LIST_REFRESH):
+        """Initialize a SharedDenyList on a store whose duration is
+        the lifetime of the tokens, with a bloom filter of at least a
+        number of bits, rebuilt every refresh seconds.
+        """
+        self.store = store
+        self._bits = bits
+        self._hashes = hashes
+        self._refresh = refresh
+        self._bloom = None
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+
+    def _build(self, now: float):
+        """Rebuild the bloom filter from the store, sized for 16 bits
+        per ID. Called with the lock held.
+        """
+        token_ids = list(self.store)
+        bloom = BloomFilter(max(self._bits, 16 * len(token_ids)),
+                            self._hashes)
+        for token_id in token_ids:
+            bloom.add(token_id)
+        self._bloom = bloom
+        self._refresh_at = now + self._refresh
+
+    def add(self, token_id: str, expires: int, user_id: str = None):
+        """Revoke a token ID of a user until the time its token
+        expires (seconds since the epoch).
+        """
+        # the store expires entries duration seconds after created_at
+        issued_at = datetime.fromtimestamp(expires - self.store.duration)
+        with self._lock:
+            self.store[token_id] = {'user_id': user_id,
+                                    'created_at': issued_at}
+            if self._bloom is not None:
+                self._bloom.add(token_id)
+        self.purge()
+
+    def __contains__(self, token_id: str) -> bool:
+        """Check that a token ID is revoked.
+        """
+        now = time.monotonic()
+        if now >= self._refresh_at and self._lock.acquire(blocking=False):
+            try:
+                if now >= self._refresh_at:
+                    self._build(now)
+            finally:
+                self._lock.release()
+        bloom = self._bloom
+        if bloom is not None and token_id not in bloom:
+            return False
+        return token_id in self.store
+
+    def purge(self, now: float = None) -> int:
+        """Forget the token IDs whose token expired at now (default:
+        the current time). Return the number of token IDs forgotten.
+        """
+        if now is None:
+            now = time.time()
+        return self.store.expire(datetime.fromtimestamp(now))
+
+    def __len__(self) -> int:
+        """Count the revoked token IDs.
+        """
+        return len(self.store)
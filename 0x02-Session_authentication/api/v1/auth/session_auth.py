@@ -1,17 +1,32 @@
 #!/usr/bin/env python3
 """Module for session-based authentication in an API.
 """
+import os
+from typing import List
 from uuid import uuid4
 from flask import request
 
 from .auth import Auth
+from .session_store import LockedSessionStore
 from models.user import User
 
 
+try:
+    SESSION_MAX_PER_USER = int(os.getenv('SESSION_MAX_PER_USER', '0'))
+except Exception:
+    SESSION_MAX_PER_USER = 0
+
+
 class SessionAuth(Auth):
     """Class for handling session-based authentication.
+    Sessions are kept in a LockedSessionStore, which also indexes
+    the session IDs of each user: listing or revoking the sessions
+    of a user costs O(sessions of that user).
+    With SESSION_MAX_PER_USER, a login beyond that many sessions
+    revokes the oldest ones of the user.
     """
-    user_id_by_session_id = {}
+    mechanism = 'session'
+    user_id_by_session_id = LockedSessionStore()
 
     def create_session(self, user_id: str = None) -> str:
         """Generate a new session ID for the given user.
@@ -23,9 +38,46 @@ class SessionAuth(Auth):
         while type(user_id) is str:
             session_id = str(uuid4())
             self.user_id_by_session_id[session_id] = user_id
+            self.cap_sessions(user_id)
             break
         return session_id
 
+    def user_session_ids(self, user_id: str) -> List[str]:
+        """Return the session IDs of a user, oldest first.
+        """
+        return self.user_id_by_session_id.session_ids(user_id)
+
+    def _revoke_session(self, session_id: str) -> bool:
+        """Remove a session. Return True if it existed.
+        """
+        return self.user_id_by_session_id.pop(session_id) is not None
+
+    def destroy_user_sessions(self, user_id: str) -> int:
+        """Revoke every session of a user (logout everywhere).
+        Return the number of sessions revoked.
+        """
+        revoked = 0
+        for session_id in self.user_session_ids(user_id):
+            if self._revoke_session(session_id):
+                revoked += 1
+        return revoked
+
+    def cap_sessions(self, user_id: str) -> int:
+        """Revoke the oldest sessions of a user beyond
+        SESSION_MAX_PER_USER (0: no limit).
+        Return the number of sessions revoked.
+        """
+        if SESSION_MAX_PER_USER <= 0:
+            return 0
+        session_ids = self.user_session_ids(user_id)
+        revoked = 0
+        i = 0
+        while i < len(session_ids) - SESSION_MAX_PER_USER:
+            if self._revoke_session(session_ids[i]):
+                revoked += 1
+            i += 1
+        return revoked
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """Retrieve the user ID associated with the given session ID.
         session_id (str, optional): The session ID to lookup.
@@ -54,12 +106,9 @@ class SessionAuth(Auth):
         False otherwise.
         """
         session_id = self.session_cookie(request)
-        user_id = self.user_id_for_session_id(session_id)
         is_destroyed = False
-        while (request is None or session_id is None) or user_id is None:
-            break
-        while session_id in self.user_id_by_session_id:
-            del self.user_id_by_session_id[session_id]
+        while session_id is not None and \
+                self.user_id_by_session_id.pop(session_id) is not None:
             is_destroyed = True
             break
         return is_destroyed
@@ -2,18 +2,55 @@
 """this Session authentication with expiration
 and storage support for the API
 """
+import os
+import threading
+import time
+from collections import OrderedDict
 from flask import request
 from datetime import datetime, timedelta
+from typing import List
 
+from models import base
 from models.user_session import UserSession
 from .session_exp_auth import SessionExpAuth
 
 
+try:
+    SESSION_NEGATIVE_CACHE = int(os.getenv('SESSION_NEGATIVE_CACHE',
+                                           '10000'))
+except Exception:
+    SESSION_NEGATIVE_CACHE = 10000
+try:
+    SESSION_NEGATIVE_TTL = float(os.getenv('SESSION_NEGATIVE_TTL', '60'))
+except Exception:
+    SESSION_NEGATIVE_TTL = 60.0
+try:
+    SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '1'))
+except Exception:
+    SESSION_CACHE_TTL = 1.0
+
+
 class SessionDBAuth(SessionExpAuth):
     """Session authentication class with expiration and
     storage support. Manages user sessions, including
     creation, retrieval, and destruction.
+    Lookups read user_id_by_session_id first: an O(1) map of the
+    sessions created or read by this process, kept in step with
+    UserSession, so storage is only read on a miss. Session IDs
+    matching no live session (bogus or expired cookies) are kept in
+    a bounded negative cache (SESSION_NEGATIVE_CACHE) for
+    SESSION_NEGATIVE_TTL seconds.
+    When other processes share the storage (STORAGE_SHARED or
+    STORAGE_BACKEND), a cached session is read again from storage
+    once SESSION_CACHE_TTL seconds old, to see their logouts, and
+    the negative cache is not used: a session created by another
+    process may reach storage after a first lookup missed it.
+    A session lasts from its last save, creation or renewal
+    (updated_at, in UTC like every stored timestamp); created_at keeps
+    its creation time.
     """
+    unknown_session_ids = OrderedDict()
+    unknown_lock = threading.Lock()
 
     def create_session(self, user_id=None) -> str:
         """Generate and store a new session ID for the user.
@@ -27,27 +64,165 @@ class SessionDBAuth(SessionExpAuth):
             }
             user_session = UserSession(**kwargs)
             user_session.save()
+            self._cache_session(session_id, user_id,
+                                user_session.updated_at)
+            if self.session_duration > 0:
+                time_span = timedelta(seconds=self.session_duration)
+                UserSession.drop_partitions(self._now() - time_span)
             return session_id
         return None
 
+    def _now(self) -> datetime:
+        """Return the current UTC time, the clock of UserSession.
+        """
+        return datetime.utcnow()
+
+    def _cache_session(self, session_id: str, user_id: str,
+                       saved_at: datetime) -> dict:
+        """Keep a session read from (or written to) storage in
+        user_id_by_session_id, lasting from saved_at, and return it.
+        """
+        session = {
+            'user_id': user_id,
+            'created_at': saved_at,
+            'checked_at': time.monotonic(),
+        }
+        self.user_id_by_session_id[session_id] = session
+        return session
+
+    @staticmethod
+    def _shared() -> bool:
+        """Check whether other processes share the storage.
+        """
+        return base.STORAGE_SHARED or base.STORAGE is not None
+
+    def _forget_session(self, session_id: str):
+        """Drop a session from user_id_by_session_id and remember
+        its ID in the negative cache (unless the storage is shared)
+        for SESSION_NEGATIVE_TTL seconds, the oldest falling out.
+        """
+        self.user_id_by_session_id.pop(session_id)
+        if self._shared():
+            return
+        with SessionDBAuth.unknown_lock:
+            unknown = SessionDBAuth.unknown_session_ids
+            unknown[session_id] = time.monotonic() + SESSION_NEGATIVE_TTL
+            unknown.move_to_end(session_id)
+            while len(unknown) > SESSION_NEGATIVE_CACHE:
+                unknown.popitem(last=False)
+
+    def _load_session(self, session_id: str) -> dict:
+        """Read a session from storage into user_id_by_session_id,
+        unless its ID is in the negative cache and not expired, and
+        schedule its expiration unless it is already scheduled.
+        Return the session, or None.
+        """
+        with SessionDBAuth.unknown_lock:
+            unknown = SessionDBAuth.unknown_session_ids
+            expires = unknown.get(session_id)
+            if expires is not None and expires > time.monotonic():
+                unknown.move_to_end(session_id)
+                return None
+            unknown.pop(session_id, None)
+        try:
+            user_session = UserSession.first({'session_id': session_id})
+        except Exception:
+            return None
+        if user_session is None:
+            self._forget_session(session_id)
+            return None
+        previous = self.user_id_by_session_id.get(session_id)
+        session = self._cache_session(session_id, user_session.user_id,
+                                      user_session.updated_at)
+        if self.session_duration > 0 and (
+                type(previous) is not dict or
+                previous.get('created_at') != session['created_at']):
+            # swept like the sessions created here, once per lifetime
+            exp_time = session['created_at'] + \
+                timedelta(seconds=self.session_duration)
+            self._schedule_expiry(session_id, exp_time)
+        return session
+
     def user_id_for_session_id(self, session_id=None):
         """Retrieve the user ID associated with a given session ID.
         Returns the user ID or None if the session is
         invalid or expired.
         """
-        try:
-            sessions = UserSession.search({'session_id': session_id})
-        except Exception:
+        if type(session_id) is not str:
             return None
-        if len(sessions) <= 0:
-            return None
-        cur_time = datetime.now()
+        cur_time = self._now()
+        if self.session_duration > 0:
+            self.sweep(cur_time)
+        shared = self._shared()
+        session = self.user_id_by_session_id.get(session_id)
+        cached = type(session) is dict and session.get('checked_at')
+        if not cached or (shared and time.monotonic() - session[
+                'checked_at'] > SESSION_CACHE_TTL):
+            session = self._load_session(session_id)
+            cached = False
+            if session is None:
+                return None
         time_span = timedelta(seconds=self.session_duration)
-        exp_time = sessions[0].created_at + time_span
+        exp_time = session['created_at'] + time_span
+        if exp_time < cur_time and cached and shared:
+            # may have been renewed by another process
+            session = self._load_session(session_id)
+            if session is None:
+                return None
+            exp_time = session['created_at'] + time_span
         while exp_time >= cur_time:
-            return sessions[0].user_id
+            if self.renewal_due(session['created_at'], cur_time):
+                self.renew_session(session_id, session['user_id'],
+                                   cur_time)
+            return session['user_id']
+        self._forget_session(session_id)
         return None
 
+    def user_session_ids(self, user_id: str) -> List[str]:
+        """Return the session IDs of a user, oldest first: the
+        UserSession objects found in the user_id index (in creation
+        order), and the sessions being created.
+        """
+        try:
+            created = {s.session_id: s.created_at
+                       for s in UserSession.search({'user_id': user_id})}
+        except Exception:
+            created = {}
+        for session_id in super().user_session_ids(user_id):
+            if session_id not in created:
+                created[session_id] = datetime.max
+        # stable: sessions of the same second stay in creation order
+        return sorted(created, key=lambda k: created[k])
+
+    def _revoke_session(self, session_id: str) -> bool:
+        """Remove a session from storage and from the session map.
+        Return True if it existed.
+        """
+        try:
+            session = UserSession.first({'session_id': session_id})
+        except Exception:
+            session = None
+        existed = session is not None or \
+            session_id in self.user_id_by_session_id
+        if session is not None:
+            session.remove()
+        self._forget_session(session_id)
+        return existed
+
+    def renew_session(self, session_id: str, user_id: str, now: datetime):
+        """Restart the lifetime of a session at now, in storage too:
+        saving it sets its updated_at.
+        """
+        try:
+            user_session = UserSession.first({'session_id': session_id})
+        except Exception:
+            user_session = None
+        if user_session is not None:
+            user_session.save()
+            now = user_session.updated_at
+        super().renew_session(session_id, user_id, now)
+        self._cache_session(session_id, user_id, now)
+
     def destroy_session(self, request=None) -> bool:
         """Invalidate and remove an authenticated session.
         Returns True if the session was successfully
@@ -55,11 +230,12 @@ class SessionDBAuth(SessionExpAuth):
         """
         session_id = self.session_cookie(request)
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            session = UserSession.first({'session_id': session_id})
         except Exception:
             return False
-        if len(sessions) <= 0:
+        if session is None:
             return False
         while True:
-            sessions[0].remove()
+            session.remove()
+            self._forget_session(session_id)
             return True
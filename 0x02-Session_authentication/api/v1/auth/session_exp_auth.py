@@ -2,7 +2,10 @@
 """ This module provides session authentication with
 expiration functionality for an API.
 """
+import heapq
 import os
+import threading
+import time
 from flask import request
 from datetime import datetime, timedelta
 
@@ -13,19 +16,41 @@ class SessionExpAuth(SessionAuth):
     """ Session authentication class with expiration handling.
     Extends the SessionAuth class to add session
     expiration functionality.
+    Expired sessions are evicted from user_id_by_session_id on access,
+    in expiration order, from a min-heap of (expiration, session ID).
+    With SESSION_SLIDING, each authenticated request extends its
+    session, but the renewal is only written once less than
+    SESSION_RENEW_THRESHOLD seconds are left (default: half the
+    duration), so at most once per session per window.
     """
+    expirations = []
+    expirations_lock = threading.Lock()
+    evictions = 0
+    last_stats = (time.monotonic(), 0)
 
     def __init__(self) -> None:
         """
         Initialize a new instance of the SessionExpAuth class.
         Set the session duration from an environment variable,
-        or default to 0 (no expiration).
+        or default to 0 (no expiration), and the sliding expiration.
         """
         super().__init__()
         try:
             self.session_duration = int(os.getenv('SESSION_DURATION', '0'))
         except Exception:
             self.session_duration = 0
+        self.session_sliding = \
+            os.getenv('SESSION_SLIDING', '') in ('1', 'true')
+        try:
+            self.session_renew_threshold = int(os.getenv(
+                'SESSION_RENEW_THRESHOLD', str(self.session_duration // 2)))
+        except Exception:
+            self.session_renew_threshold = self.session_duration // 2
+
+    def _now(self) -> datetime:
+        """ Return the current time on the clock of the sessions.
+        """
+        return datetime.now()
 
     def create_session(self, user_id=None):
         """ Create a new session ID for the given user ID.
@@ -36,18 +61,105 @@ class SessionExpAuth(SessionAuth):
         session_id = super().create_session(user_id)
         if type(session_id) != str:
             return None
+        created_at = self._now()
         self.user_id_by_session_id[session_id] = {
             'user_id': user_id,
-            'created_at': datetime.now(),
+            'created_at': created_at,
         }
+        if self.session_duration > 0:
+            exp_time = created_at + timedelta(seconds=self.session_duration)
+            self._schedule_expiry(session_id, exp_time)
+            self.sweep(created_at)
         return session_id
 
+    def _schedule_expiry(self, session_id: str, exp_time: datetime):
+        """ Push a session on the expiration heap.
+        """
+        with SessionExpAuth.expirations_lock:
+            heapq.heappush(SessionExpAuth.expirations,
+                           (exp_time, session_id))
+
+    def renewal_due(self, created_at: datetime, now: datetime) -> bool:
+        """ Check that a sliding session created (or last renewed) at
+        created_at has less than the renewal threshold left at now.
+        """
+        if not self.session_sliding or self.session_duration <= 0:
+            return False
+        exp_time = created_at + timedelta(seconds=self.session_duration)
+        return exp_time - now < \
+            timedelta(seconds=self.session_renew_threshold)
+
+    def renew_session(self, session_id: str, user_id: str, now: datetime):
+        """ Restart the lifetime of a session at now.
+        """
+        self.user_id_by_session_id[session_id] = {
+            'user_id': user_id,
+            'created_at': now,
+        }
+        exp_time = now + timedelta(seconds=self.session_duration)
+        self._schedule_expiry(session_id, exp_time)
+
+    def sweep(self, now: datetime = None) -> int:
+        """ Evict the sessions expired at now (default: the current
+        time), O(log n) each. Costs one comparison if none is due:
+        the earliest expiration is read without the lock (a stale read
+        only defers the sweep to the next call).
+        Return the number of sessions evicted.
+        """
+        if now is None:
+            now = self._now()
+        try:
+            due = SessionExpAuth.expirations[0][0] < now
+        except IndexError:
+            due = False
+        if not due:
+            return 0
+        evicted = 0
+        time_span = timedelta(seconds=self.session_duration)
+
+        def expired(session_dict) -> bool:
+            # false for sessions renewed since
+            return type(session_dict) is dict and \
+                session_dict.get('created_at') is not None and \
+                session_dict['created_at'] + time_span < now
+
+        with SessionExpAuth.expirations_lock:
+            heap = SessionExpAuth.expirations
+            while len(heap) > 0 and heap[0][0] < now:
+                session_id = heapq.heappop(heap)[1]
+                if self.user_id_by_session_id.pop_if(session_id, expired):
+                    evicted += 1
+            SessionExpAuth.evictions += evicted
+        return evicted
+
+    def session_stats(self) -> dict:
+        """ Return the number of live sessions, the number of evicted
+        sessions, and the evictions per second since the previous call.
+        """
+        with SessionExpAuth.expirations_lock:
+            now = time.monotonic()
+            last_time, last_evictions = SessionExpAuth.last_stats
+            evictions = SessionExpAuth.evictions
+            SessionExpAuth.last_stats = (now, evictions)
+        rate = 0.0
+        if now > last_time:
+            rate = (evictions - last_evictions) / (now - last_time)
+        return {
+            'live_sessions': len(self.user_id_by_session_id),
+            'evictions': evictions,
+            'evictions_per_second': rate,
+        }
+
     def user_id_for_session_id(self, session_id=None) -> str:
         """ Retrieve the user ID associated with the given session ID.
         Check if the session has expired based on the session duration.
         Return the user ID if the session is valid, or None
         if it has expired or doesn't exist.
         """
+        cur_time = None
+        if self.session_duration > 0:
+            cur_time = self._now()
+            self.sweep(cur_time)
         if session_id not in self.user_id_by_session_id:
             return None
 
@@ -58,11 +170,13 @@ class SessionExpAuth(SessionAuth):
         if 'created_at' not in session_dict:
             return None
 
-        cur_time = datetime.now()
         time_span = timedelta(seconds=self.session_duration)
         exp_time = session_dict['created_at'] + time_span
 
         while exp_time >= cur_time:
+            if self.renewal_due(session_dict['created_at'], cur_time):
+                self.renew_session(session_id, session_dict['user_id'],
+                                   cur_time)
             return session_dict['user_id']
 
         return None
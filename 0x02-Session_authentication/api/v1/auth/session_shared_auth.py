@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Session authentication with expiration, whose sessions are
+shared by every worker process of the API.
+"""
+import os
+import time
+from datetime import datetime
+
+from .session_exp_auth import SessionExpAuth
+from .session_store import load_session_store
+
+
+try:
+    SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+except Exception:
+    SESSION_SWEEP_INTERVAL = 60.0
+
+
+class SessionSharedAuth(SessionExpAuth):
+    """Session authentication with expiration, keeping the sessions
+    in a store all workers reach (SESSION_STORE): a SQLite file
+    (SESSION_STORE_PATH) by default, or redis (SESSION_STORE_URL).
+    A session created by one worker is valid in every other.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a SessionSharedAuth on the configured store.
+        """
+        super().__init__()
+        self.user_id_by_session_id = load_session_store(
+            os.getenv('SESSION_STORE', 'sqlite'), self.session_duration)
+        self.next_sweep = 0.0
+
+    def _schedule_expiry(self, session_id: str, exp_time: datetime):
+        """The store keeps the expiration of each session.
+        """
+        pass
+
+    def sweep(self, now: datetime = None) -> int:
+        """Delete the sessions expired at now (default: the current
+        time) from the store in one batch, at most once every
+        SESSION_SWEEP_INTERVAL seconds per worker.
+        Return the number of sessions deleted.
+        """
+        mono = time.monotonic()
+        if mono < self.next_sweep:
+            return 0
+        self.next_sweep = mono + SESSION_SWEEP_INTERVAL
+        if now is None:
+            now = self._now()
+        evicted = self.user_id_by_session_id.expire(now)
+        with SessionExpAuth.expirations_lock:
+            SessionExpAuth.evictions += evicted
+        return evicted
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Session store module: in-memory, or shared by the processes.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Iterator, List
+
+
+_MISSING = object()
+
+
+def _user_id(value) -> str:
+    """Return the user ID of a session: a user ID, or a dict
+    with the user ID.
+    """
+    if type(value) is dict:
+        return value.get('user_id')
+    return value
+
+
+class SessionStore():
+    """Interface of the in-memory map of session IDs to sessions
+    used by the session authentications.
+    It behaves like a dict for get, pop, [], in, del, len and
+    iteration (over the session IDs).
+    """
+
+    def get(self, session_id: str, default=None):
+        """Return the session with this ID, or default.
+        """
+        raise NotImplementedError
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session.
+        """
+        raise NotImplementedError
+
+    def pop(self, session_id: str, default=None):
+        """Remove and return the session with this ID, or default.
+        """
+        raise NotImplementedError
+
+    def pop_if(self, session_id: str, predicate: Callable) -> bool:
+        """Remove the session with this ID if predicate(session)
+        is true, atomically. Return True if it was removed.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """Count the sessions.
+        """
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the session IDs.
+        """
+        raise NotImplementedError
+
+    def session_ids(self, user_id: str) -> List[str]:
+        """Return the IDs of the sessions of a user, oldest first.
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, session_id: str):
+        """Return the session with this ID.
+        """
+        value = self.get(session_id, _MISSING)
+        if value is _MISSING:
+            raise KeyError(session_id)
+        return value
+
+    def __contains__(self, session_id: str) -> bool:
+        """Check that a session with this ID exists.
+        """
+        return self.get(session_id, _MISSING) is not _MISSING
+
+    def __delitem__(self, session_id: str):
+        """Remove the session with this ID.
+        """
+        if self.pop(session_id, _MISSING) is _MISSING:
+            raise KeyError(session_id)
+
+
+class LockedSessionStore(dict, SessionStore):
+    """Session store in one dict: reads (get, [], in, len) are one
+    atomic dict operation and take no lock, writes take one lock,
+    which also guards the index of the session IDs of each user
+    (in write order).
+    """
+
+    def __init__(self):
+        """Initialize an empty LockedSessionStore.
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+        self._by_user = {}
+
+    def _unlink(self, session_id: str, value):
+        """Drop a session from the index of its user.
+        Called with the lock held.
+        """
+        user_id = _user_id(value)
+        session_ids = self._by_user.get(user_id)
+        if session_ids is None:
+            return
+        session_ids.pop(session_id, None)
+        if len(session_ids) == 0:
+            del self._by_user[user_id]
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session, indexed under its user as the newest.
+        """
+        user_id = _user_id(value)
+        with self._lock:
+            previous = dict.get(self, session_id, _MISSING)
+            dict.__setitem__(self, session_id, value)
+            if previous is not _MISSING:
+                self._unlink(session_id, previous)
+            session_ids = self._by_user.get(user_id)
+            if session_ids is None:
+                self._by_user[user_id] = {session_id: None}
+            else:
+                session_ids[session_id] = None
+
+    def pop(self, session_id: str, default=None):
+        """Remove and return the session with this ID, or default.
+        """
+        with self._lock:
+            value = dict.pop(self, session_id, _MISSING)
+            if value is _MISSING:
+                return default
+            self._unlink(session_id, value)
+            return value
+
+    def __delitem__(self, session_id: str):
+        """Remove the session with this ID.
+        """
+        SessionStore.__delitem__(self, session_id)
+
+    def pop_if(self, session_id: str, predicate: Callable) -> bool:
+        """Remove the session with this ID if predicate(session)
+        is true, atomically. Return True if it was removed.
+        """
+        with self._lock:
+            value = dict.get(self, session_id, _MISSING)
+            if value is _MISSING or not predicate(value):
+                return False
+            dict.__delitem__(self, session_id)
+            self._unlink(session_id, value)
+            return True
+
+    def session_ids(self, user_id: str) -> List[str]:
+        """Return the IDs of the sessions of a user, oldest first.
+        """
+        with self._lock:
+            return list(self._by_user.get(user_id, ()))
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite database file in WAL mode, shared by
+    every process of the host. Sessions created with a duration get an
+    expiration, indexed, so expired ones are deleted in batches.
+    """
+
+    def __init__(self, file_path: str, duration: int = 0,
+                 table: str = 'sessions'):
+        """Initialize a SQLiteSessionStore on a table of a database
+        file, for sessions lasting duration seconds (0: no expiration).
+        """
+        self.file_path = file_path
+        self.duration = duration
+        self.table = table
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS {} ('
+                     'session_id TEXT PRIMARY KEY, user_id TEXT, '
+                     'created_at REAL, expires_at REAL)'.format(table))
+        conn.execute('CREATE INDEX IF NOT EXISTS {0}_expires_at '
+                     'ON {0}(expires_at)'.format(table))
+        conn.execute('CREATE INDEX IF NOT EXISTS {0}_user_id '
+                     'ON {0}(user_id, created_at)'.format(table))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _decode(row: tuple):
+        """Return the session of a (user_id, created_at) row.
+        """
+        if row[1] is None:
+            return row[0]
+        return {'user_id': row[0],
+                'created_at': datetime.fromtimestamp(row[1])}
+
+    def get(self, session_id: str, default=None):
+        """Return the session with this ID, or default.
+        """
+        row = self._connection().execute(
+            'SELECT user_id, created_at FROM {} '
+            'WHERE session_id = ?'.format(self.table),
+            (session_id,)).fetchone()
+        if row is None:
+            return default
+        return self._decode(row)
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session: a user ID, or a dict with the user ID
+        and the creation time.
+        """
+        user_id = value
+        created_at = None
+        expires_at = None
+        if type(value) is dict:
+            user_id = value.get('user_id')
+            if value.get('created_at') is not None:
+                created_at = value['created_at'].timestamp()
+                if self.duration > 0:
+                    expires_at = created_at + self.duration
+        self._connection().execute(
+            'INSERT OR REPLACE INTO {} VALUES (?, ?, ?, ?)'.format(
+                self.table), (session_id, user_id, created_at, expires_at))
+
+    def pop(self, session_id: str, default=None):
+        """Remove and return the session with this ID, or default.
+        """
+        value = default
+
+        def found(session) -> bool:
+            nonlocal value
+            value = session
+            return True
+
+        self.pop_if(session_id, found)
+        return value
+
+    def pop_if(self, session_id: str, predicate: Callable) -> bool:
+        """Remove the session with this ID if predicate(session)
+        is true, in one transaction. Return True if it was removed.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT user_id, created_at FROM {} '
+                'WHERE session_id = ?'.format(self.table),
+                (session_id,)).fetchone()
+            removed = row is not None and predicate(self._decode(row))
+            if removed:
+                conn.execute('DELETE FROM {} WHERE session_id = ?'.format(
+                    self.table), (session_id,))
+        finally:
+            conn.execute('COMMIT')
+        return removed
+
+    def expire(self, now: datetime) -> int:
+        """Delete the sessions expired at now, in one statement.
+        Return how many were deleted.
+        """
+        return self._connection().execute(
+            'DELETE FROM {} WHERE expires_at < ?'.format(self.table),
+            (now.timestamp(),)).rowcount
+
+    def __len__(self) -> int:
+        """Count the sessions.
+        """
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the session IDs.
+        """
+        return (row[0] for row in self._connection().execute(
+            'SELECT session_id FROM {}'.format(self.table)).fetchall())
+
+    def session_ids(self, user_id: str) -> List[str]:
+        """Return the IDs of the sessions of a user, oldest first
+        (those without a creation time last), from the
+        (user_id, created_at) index.
+        """
+        return [row[0] for row in self._connection().execute(
+            'SELECT session_id FROM {} WHERE user_id = ? '
+            'ORDER BY created_at IS NULL, created_at, rowid'.format(
+                self.table), (user_id,))]
+
+
+class KVSessionStore(SessionStore):
+    """Session store in an external key-value store, through a client
+    with get(key), set(key, value, ex=seconds), delete(key),
+    scan_iter(pattern), and sadd, srem, smembers for the set of
+    session IDs of each user, such as redis.Redis. Expiration is left
+    to the store (ex), so expire() has nothing to do; expired IDs
+    are dropped from the user sets when listed.
+    pop and pop_if read then delete: a concurrent write in between
+    may be lost.
+    """
+
+    def __init__(self, client, duration: int = 0,
+                 prefix: str = 'session:',
+                 user_prefix: str = 'session_user:'):
+        """Initialize a KVSessionStore on a client, for sessions
+        lasting duration seconds (0: no expiration).
+        """
+        self.client = client
+        self.duration = duration
+        self.prefix = prefix
+        self.user_prefix = user_prefix
+
+    def get(self, session_id: str, default=None):
+        """Return the session with this ID, or default.
+        """
+        data = self.client.get(self.prefix + str(session_id))
+        if data is None:
+            return default
+        value = json.loads(data)
+        if type(value) is dict and value.get('created_at') is not None:
+            value['created_at'] = datetime.fromisoformat(value['created_at'])
+        return value
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session, expiring after duration seconds.
+        """
+        data = value
+        if type(value) is dict and value.get('created_at') is not None:
+            data = dict(value)
+            data['created_at'] = value['created_at'].isoformat()
+        ex = self.duration if self.duration > 0 else None
+        self.client.set(self.prefix + str(session_id), json.dumps(data),
+                        ex=ex)
+        self.client.sadd(self.user_prefix + str(_user_id(value)),
+                         str(session_id))
+
+    def pop(self, session_id: str, default=None):
+        """Remove and return the session with this ID, or default.
+        """
+        value = self.get(session_id, _MISSING)
+        if value is _MISSING:
+            return default
+        self.client.delete(self.prefix + str(session_id))
+        self.client.srem(self.user_prefix + str(_user_id(value)),
+                         str(session_id))
+        return value
+
+    def pop_if(self, session_id: str, predicate: Callable) -> bool:
+        """Remove the session with this ID if predicate(session)
+        is true. Return True if it was removed.
+        """
+        value = self.get(session_id, _MISSING)
+        if value is _MISSING or not predicate(value):
+            return False
+        self.client.srem(self.user_prefix + str(_user_id(value)),
+                         str(session_id))
+        return self.client.delete(self.prefix + str(session_id)) > 0
+
+    def expire(self, now: datetime) -> int:
+        """Nothing to do: the store expires sessions itself.
+        """
+        return 0
+
+    def __len__(self) -> int:
+        """Count the sessions (scans the keys).
+        """
+        return sum(1 for key in self.client.scan_iter(self.prefix + '*'))
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the session IDs (scans the keys).
+        """
+        for key in self.client.scan_iter(self.prefix + '*'):
+            if type(key) is bytes:
+                key = key.decode('utf-8')
+            yield key[len(self.prefix):]
+
+    def session_ids(self, user_id: str) -> List[str]:
+        """Return the IDs of the sessions of a user, oldest first.
+        """
+        key = self.user_prefix + str(user_id)
+        sessions = []
+        for session_id in self.client.smembers(key):
+            if type(session_id) is bytes:
+                session_id = session_id.decode('utf-8')
+            value = self.get(session_id, _MISSING)
+            if value is _MISSING:
+                # expired in the store
+                self.client.srem(key, session_id)
+                continue
+            created_at = datetime.max
+            if type(value) is dict and value.get('created_at') is not None:
+                created_at = value['created_at']
+            sessions.append((created_at, session_id))
+        sessions.sort()
+        return [session_id for created_at, session_id in sessions]
+
+
+def load_session_store(name: str, duration: int = 0,
+                       namespace: str = 'session') -> SessionStore:
+    """Return the shared session store called name ('sqlite' or
+    'redis'), for sessions lasting duration seconds. Stores of
+    another namespace use their own table or keys.
+    """
+    if name == 'redis':
+        import redis
+        client = redis.Redis.from_url(
+            os.getenv('SESSION_STORE_URL', 'redis://localhost:6379/0'))
+        return KVSessionStore(client, duration, namespace + ':',
+                              namespace + '_user:')
+    return SQLiteSessionStore(
+        os.getenv('SESSION_STORE_PATH', '.db_sessions.sqlite3'), duration,
+        namespace + 's')
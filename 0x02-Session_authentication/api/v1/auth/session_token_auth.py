@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Stateless session authentication with signed tokens.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+from uuid import uuid4
+
+from .deny_list import DenyList, SharedDenyList
+from .session_auth import SessionAuth
+from .session_store import load_session_store
+
+
+TOKEN_DURATION = 86400
+
+
+class SessionTokenAuth(SessionAuth):
+    """Session authentication whose session cookie is a token signed
+    with HMAC-SHA256: the user ID, issue time, expiration and token ID,
+    then the signature. A token is validated from the cookie alone,
+    without looking up a session store.
+    Tokens always expire, so logged out ones are not denied for ever:
+    after SESSION_DURATION seconds, or TOKEN_DURATION without it.
+    The key is SESSION_SECRET, and every process holding it accepts the
+    tokens: logged out ones go to a deny-list in the shared session
+    store (SESSION_STORE), until they expire, refused by the other
+    processes within DENY_LIST_REFRESH seconds. Without SESSION_SECRET, a
+    random key is drawn, the tokens are only valid in this process until
+    it exits, and so is the deny-list (bloom filter plus exact set).
+    """
+    mechanism = 'token'
+
+    def __init__(self) -> None:
+        """Initialize a SessionTokenAuth with the key from SESSION_SECRET
+        and the token lifetime from SESSION_DURATION.
+        """
+        super().__init__()
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION', '0'))
+        except Exception:
+            self.session_duration = 0
+        if self.session_duration <= 0:
+            self.session_duration = TOKEN_DURATION
+        secret = os.getenv('SESSION_SECRET')
+        if secret:
+            self.secret = secret.encode('utf-8')
+            self.deny_list = SharedDenyList(load_session_store(
+                os.getenv('SESSION_STORE', 'sqlite'),
+                self.session_duration, 'revoked_token'))
+        else:
+            self.secret = os.urandom(32)
+            self.deny_list = DenyList()
+
+    def _sign(self, payload: bytes) -> str:
+        """Return the signature of an encoded payload.
+        """
+        digest = hmac.new(self.secret, payload, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def create_session(self, user_id: str = None) -> str:
+        """Return a signed token for the given user ID,
+        or None if user_id is not a string.
+        """
+        if type(user_id) is not str:
+            return None
+        issued_at = int(time.time())
+        expires = issued_at + self.session_duration
+        payload = base64.urlsafe_b64encode('{}:{}:{}:{}'.format(
+            user_id, issued_at, expires, uuid4().hex).encode('utf-8'))
+        payload = payload.rstrip(b'=')
+        return '{}.{}'.format(payload.decode('ascii'), self._sign(payload))
+
+    def _claims(self, session_id: str) -> tuple:
+        """Return the (user ID, issue time, expiration, token ID) of a
+        token with a valid signature, or None.
+        """
+        if type(session_id) is not str:
+            return None
+        payload, sep, signature = session_id.rpartition('.')
+        if len(sep) == 0:
+            return None
+        try:
+            payload = payload.encode('ascii')
+            if not hmac.compare_digest(self._sign(payload), signature):
+                return None
+            padding = b'=' * (-len(payload) % 4)
+            fields = base64.urlsafe_b64decode(payload + padding)
+            user_id, issued_at, expires, token_id = \
+                fields.decode('utf-8').rsplit(':', 3)
+            return user_id, int(issued_at), int(expires), token_id
+        except Exception:
+            return None
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Return the user ID of a token if it is signed, not expired
+        and not logged out, or None.
+        """
+        claims = self._claims(session_id)
+        if claims is None:
+            return None
+        user_id, issued_at, expires, token_id = claims
+        if expires < time.time():
+            return None
+        if token_id in self.deny_list:
+            return None
+        return user_id
+
+    def destroy_session(self, request=None) -> bool:
+        """Log out the token of the request, by adding it to the
+        deny-list until it expires.
+        Return True if a valid token was logged out, False otherwise.
+        """
+        session_id = self.session_cookie(request)
+        if self.user_id_for_session_id(session_id) is None:
+            return False
+        user_id, issued_at, expires, token_id = self._claims(session_id)
+        self.deny_list.add(token_id, expires, user_id)
+        return True
@@ -17,11 +17,18 @@ def status() -> str:
 def stats() -> str:
     """Retrieves the statistics of the application.
     Returns:
-        A JSON response containing the count of users.
+        A JSON response containing the count of users, the
+        session counters of an expiring session authentication, and
+        the credential cache counters of the basic authentication.
     """
     from models.user import User
+    from api.v1.app import auth
     stats = {}
     stats['users'] = User.count()
+    if hasattr(auth, 'session_stats'):
+        stats['sessions'] = auth.session_stats()
+    if hasattr(auth, 'cache_stats'):
+        stats['credential_cache'] = auth.cache_stats()
     return jsonify(stats)
 
 
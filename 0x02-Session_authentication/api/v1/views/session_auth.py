@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 """Module of session authenticating views.
 """
-import os
 from typing import Tuple
 from flask import abort, jsonify, request
 
 from models.user import User
+from api.v1.auth.auth import SESSION_NAME
 from api.v1.views import app_views
 
 
@@ -23,16 +23,16 @@ def login() -> Tuple[str, int]:
     if password is None or len(password.strip()) == 0:
         return jsonify({"error": "password missing"}), 400
     try:
-        users = User.search({'email': email})
+        user = User.first({'email': email})
     except Exception:
         return jsonify(not_found_res), 404
-    if len(users) <= 0:
+    if user is None:
         return jsonify(not_found_res), 404
-    if users[0].is_valid_password(password):
+    if user.is_valid_password(password):
         from api.v1.app import auth
-        sessiond_id = auth.create_session(getattr(users[0], 'id'))
-        res = jsonify(users[0].to_json())
-        res.set_cookie(os.getenv("SESSION_NAME"), sessiond_id)
+        sessiond_id = auth.create_session(getattr(user, 'id'))
+        res = jsonify(user.to_json())
+        res.set_cookie(SESSION_NAME, sessiond_id)
         return res
     return jsonify({"error": "wrong password"}), 401
 
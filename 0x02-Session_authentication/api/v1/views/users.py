@@ -1,21 +1,144 @@
 #!/usr/bin/env python3
 """This module contains the User views for a RESTful API."""
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
+
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
+from models.base import TIMESTAMP_FORMAT
 from models.user import User
 
 
+PAGE_LIMIT = 100
+EXPORT_BATCH = 1000
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp as a naive UTC datetime, the way
+    timestamps are stored. Raise ValueError if it is invalid.
+    """
+    if value[-1:] in ('Z', 'z'):
+        # fromisoformat only reads a 'Z' suffix from Python 3.11
+        value = value[:-1] + '+00:00'
+    result = datetime.fromisoformat(value)
+    if result.tzinfo is not None:
+        result = result.astimezone(timezone.utc).replace(tzinfo=None)
+    return result
+
+
+def _encode_cursor(user: User) -> str:
+    """Encode the (created_at, id) key of a user as a page cursor,
+    at the stored precision so it stays valid after a reload.
+    """
+    key = '{}|{}'.format(user.created_at.strftime(TIMESTAMP_FORMAT),
+                         user.id)
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a page cursor into a (created_at, id) key.
+    Return None if the cursor is invalid.
+    """
+    try:
+        key = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, user_id = key.split('|', 1)
+        return _parse_timestamp(created_at), user_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
 @app_views.route('/users', methods=['GET'],
                  strict_slashes=False)
 def view_all_users() -> str:
-    """Retrieve a list of all User objects in JSON format."""
+    """Retrieve a list of all User objects in JSON format.
+    Each user is rendered from its cached encoded JSON, as they are
+    iterated (no list of the users).
+    With the `limit` and/or `cursor` query parameters, return one
+    page of users ordered by creation, and the cursor of the next
+    page (null on the last page).
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is not None or cursor is not None:
+        return _view_users_page(limit, cursor)
+    all_users = []
+    users = User.iter_all()
+    user = next(users, None)
+    while user is not None:
+        all_users.append(user.to_json_bytes())
+        user = next(users, None)
+    body = b'[' + b', '.join(all_users) + b']\n'
+    return Response(body, mimetype='application/json')
+
+
+def _view_users_page(limit: str = None, cursor: str = None) -> str:
+    """Retrieve one page of User objects, after the cursor."""
+    after = None
+    if cursor is not None:
+        after = _decode_cursor(cursor)
+        if after is None:
+            return jsonify({'error': "Wrong cursor"}), 400
+    if limit is None:
+        limit = PAGE_LIMIT
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "Wrong limit"}), 400
+    # one more user tells whether there is a next page
+    users = User.page(limit + 1, after)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = _encode_cursor(users[-1])
     all_users = []
-    users = User.all()
     index = 0
     while index < len(users):
-        all_users.append(users[index].to_json())
+        all_users.append(users[index].to_json_bytes())
         index += 1
-    return jsonify(all_users)
+    body = b'{"next_cursor": ' + json.dumps(next_cursor).encode() + \
+        b', "users": [' + b', '.join(all_users) + b']}\n'
+    return Response(body, mimetype='application/json')
+
+
+@app_views.route('/users/export', methods=['GET'],
+                 strict_slashes=False)
+def export_users() -> str:
+    """Stream every User object as newline-delimited JSON.
+    The optional `since` query parameter (an ISO 8601 timestamp, UTC
+    unless it has an offset) only keeps users updated at or after it.
+    """
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = _parse_timestamp(since)
+        except ValueError:
+            return jsonify({'error': "Wrong since"}), 400
+    return Response(_export_users(since), mimetype='application/x-ndjson')
+
+
+def _export_users(since: datetime = None) -> Iterator[bytes]:
+    """Yield one JSON line per user, reading the users by pages
+    so memory does not depend on the number of users.
+    With since, pages come from the updated_at index.
+    """
+    attribute = 'created_at' if since is None else 'updated_at'
+    after = None
+    while True:
+        users = User.query(attribute, start=since, after=after,
+                           limit=EXPORT_BATCH)
+        index = 0
+        while index < len(users):
+            yield users[index].to_json_bytes() + b'\n'
+            index += 1
+        if len(users) < EXPORT_BATCH:
+            return
+        after = (getattr(users[-1], attribute), users[-1].id)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'],
@@ -66,6 +189,9 @@ def delete_user(user_id: str = None) -> str:
                 keep_going = False
             else:
                 user.remove()
+                from api.v1.app import auth
+                if hasattr(auth, 'destroy_user_sessions'):
+                    auth.destroy_user_sessions(user.id)
                 return jsonify({}), 200
                 keep_going = False
 
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Benchmark of the function calls made by the authentication of one
+request (the before_request of the app), for a session cookie and a
+Basic Authorization header: as it was (current_user, then the header
+and the cookie read again, SESSION_NAME read from the environment on
+each read) against authenticate: the user resolved once (in the
+AuthContext of the session auths, from the header alone by Basic
+auth), the header and cookie read again only when it fails.
+Run from the project root: python3 -m benchmarks.auth_calls
+"""
+import base64
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+
+REQUESTS = 20000
+REPEATS = 5
+
+
+class Request():
+    """Request with an Authorization header and a session cookie.
+    """
+
+    def __init__(self, header: str = None, session_id: str = None):
+        """Initialize a Request with a header and a cookie.
+        """
+        self.headers = {}
+        self.cookies = {}
+        if header is not None:
+            self.headers['Authorization'] = header
+        if session_id is not None:
+            self.cookies[os.environ['SESSION_NAME']] = session_id
+
+
+class LegacyAuth():
+    """Header and cookie reads as they were: from the request on
+    every call, with SESSION_NAME read from the environment.
+    """
+
+    def authorization_header(self, request=None) -> str:
+        """Read the Authorization header.
+        """
+        if request is not None:
+            return request.headers.get('Authorization', None)
+        return None
+
+    def session_cookie(self, request=None) -> str:
+        """Read the session cookie.
+        """
+        if request is not None:
+            cookie_name = os.getenv('SESSION_NAME')
+            return request.cookies.get(cookie_name)
+
+
+def before_request_legacy(auth, request):
+    """The before_request of the app as it was.
+    """
+    user = auth.current_user(request)
+    if auth.authorization_header(request) is None and \
+            auth.session_cookie(request) is None:
+        return None
+    return user
+
+
+def before_request(auth, request):
+    """The before_request of the app with authenticate.
+    """
+    user = auth.authenticate(request)
+    if user is None and auth.authorization_header(request) is None and \
+            auth.session_cookie(request) is None:
+        return None
+    return user
+
+
+def count_calls(function, *args) -> int:
+    """Return the number of Python and C function calls made by
+    function(*args).
+    """
+    calls = [0]
+
+    def profile(frame, event, arg):
+        if event in ('call', 'c_call'):
+            calls[0] += 1
+
+    sys.setprofile(profile)
+    try:
+        function(*args)
+    finally:
+        sys.setprofile(None)
+    # the call of function itself and of sys.setprofile
+    return calls[0] - 2
+
+
+def timed(function, auth, make_request) -> float:
+    """Return the mean latency (in µs) of function(auth, request)
+    on fresh requests, the best of REPEATS runs.
+    """
+    best = None
+    for i in range(REPEATS):
+        requests = [make_request() for i in range(REQUESTS)]
+        start = time.perf_counter()
+        for request in requests:
+            function(auth, request)
+        duration = (time.perf_counter() - start) / REQUESTS * 1e6
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def main():
+    """Run the benchmark; the auth modules read SESSION_NAME at
+    import, so they are imported once it is set.
+    """
+    os.environ.setdefault('SESSION_NAME', '_my_session_id')
+    base = importlib.import_module('models.base')
+    User = importlib.import_module('models.user').User
+    BasicAuth = importlib.import_module('api.v1.auth.basic_auth').BasicAuth
+    SessionAuth = importlib.import_module(
+        'api.v1.auth.session_auth').SessionAuth
+    os.chdir(tempfile.mkdtemp())
+    base.DATA['User'] = {}
+    user = User(email='bob@example.com')
+    user.password = 'secret'
+    base.DATA['User'][user.id] = user
+    User.build_indexes()
+    header = 'Basic ' + base64.b64encode(b'bob@example.com:secret').decode()
+    cases = []
+    for name, cls, make_request in [
+            ('session cookie', SessionAuth, None),
+            ('basic header', BasicAuth, lambda: Request(header=header))]:
+        auth = cls()
+        legacy = type('Legacy' + cls.__name__, (LegacyAuth, cls), {})()
+        if make_request is None:
+            session_id = auth.create_session(user.id)
+
+            def make_request(session_id=session_id):
+                return Request(session_id=session_id)
+        # warm the caches of both
+        before_request(auth, make_request())
+        before_request_legacy(legacy, make_request())
+        assert before_request(auth, make_request()) is user
+        assert before_request_legacy(legacy, make_request()) is user
+        cases.append((name, legacy, auth, make_request))
+    print("{:>16} {:>14} {:>14} {:>12} {:>12}".format(
+        "request", "calls before", "calls after", "µs before", "µs after"))
+    for name, legacy, auth, make_request in cases:
+        print("{:>16} {:>14} {:>14} {:>12.2f} {:>12.2f}".format(
+            name,
+            count_calls(before_request_legacy, legacy, make_request()),
+            count_calls(before_request, auth, make_request()),
+            timed(before_request_legacy, legacy, make_request),
+            timed(before_request, auth, make_request)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Multi-threaded stress benchmark of models.base: read throughput
+(User.search by email, User.all) while writer threads save and
+remove users.
+Run from the project root: python3 -m benchmarks.concurrency
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from models import base
+from models.user import User
+
+
+USERS = 10000
+READERS = 4
+DURATION = 2.0
+
+
+def reader(stop: threading.Event, counts: list, errors: list):
+    """Search users until stop is set.
+    """
+    n = 0
+    try:
+        while not stop.is_set():
+            User.search({'email': 'user{}@example.com'.format(n % USERS)})
+            if n % 1000 == 0:
+                User.all()
+            n += 1
+    except Exception as e:
+        errors.append(e)
+    counts.append(n)
+
+
+def writer(stop: threading.Event, counts: list, errors: list):
+    """Create and remove users until stop is set.
+    """
+    n = 0
+    try:
+        while not stop.is_set():
+            user = User(email='new{}@example.com'.format(n))
+            user.save()
+            user.remove()
+            n += 1
+    except Exception as e:
+        errors.append(e)
+    counts.append(n)
+
+
+def run(writers: int) -> tuple:
+    """Return (reads/s, writes/s, errors) for READERS readers
+    and `writers` writers.
+    """
+    stop = threading.Event()
+    reads, writes, errors = [], [], []
+    threads = [threading.Thread(target=reader, args=(stop, reads, errors))
+               for i in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(stop, writes, errors))
+                for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    base.flush()
+    return sum(reads) / DURATION, sum(writes) / DURATION, len(errors)
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    base.STORAGE_MODE = 'journal'
+    base.STORAGE_DURABILITY = sys.argv[1] if len(sys.argv) > 1 else 'async'
+    User.load_from_file()
+    for i in range(USERS):
+        user = User(email='user{}@example.com'.format(i))
+        base.DATA['User'][user.id] = user
+    User.build_indexes()
+    User.save_to_file()
+    print("{} users, {} readers, journal/{}".format(
+        USERS, READERS, base.STORAGE_DURABILITY))
+    print("{:>8} {:>12} {:>12} {:>8}".format(
+        "writers", "reads/s", "writes/s", "errors"))
+    for writers in [0, 1, 4]:
+        print("{:>8} {:>12.0f} {:>12.0f} {:>8}".format(writers, *run(writers)))
+    User.load_from_file()
+    assert User.count() == USERS
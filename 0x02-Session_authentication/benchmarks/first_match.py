@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark of first-match lookups: User.search(...)[0] against
+User.first(...), and User.all() against User.iter_all(), in time
+and peak memory.
+Run from the project root: python3 -m benchmarks.first_match [users]
+"""
+import sys
+import time
+import tracemalloc
+
+from models.base import DATA
+from models.user import User
+
+
+USERS = 100000
+LOOKUPS = 200
+
+
+def populate(size: int):
+    """Fill DATA with `size` users, half of them named Bob,
+    and rebuild the indexes.
+    """
+    DATA['User'] = {}
+    for i in range(size):
+        user = User(email='user{}@example.com'.format(i))
+        user.first_name = 'Bob' if i % 2 else 'Alice'
+        DATA['User'][user.id] = user
+    User.build_indexes()
+
+
+def timed(function, count: int) -> float:
+    """Return the mean latency (in µs) of function.
+    """
+    start = time.perf_counter()
+    for i in range(count):
+        function()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def peak(function) -> float:
+    """Return the peak memory (in KB) allocated by function.
+    """
+    tracemalloc.start()
+    function()
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result / 1e3
+
+
+def walk(users):
+    """Consume users one by one.
+    """
+    for user in users:
+        pass
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    populate(size)
+    email = {'email': 'user{}@example.com'.format(size // 2)}
+    name = {'first_name': 'Bob'}
+    print("{} users".format(size))
+    print("{:>28} {:>12} {:>12}".format("", "list (µs)", "first (µs)"))
+    print("{:>28} {:>12.2f} {:>12.2f}".format(
+        "by email (indexed)",
+        timed(lambda: User.search(email)[0], LOOKUPS * 100),
+        timed(lambda: User.first(email), LOOKUPS * 100)))
+    print("{:>28} {:>12.2f} {:>12.2f}".format(
+        "by first_name (not indexed)",
+        timed(lambda: User.search(name)[0], LOOKUPS),
+        timed(lambda: User.first(name), LOOKUPS)))
+    print("{:>28} {:>12} {:>12}".format("", "all (KB)", "iter (KB)"))
+    print("{:>28} {:>12.0f} {:>12.0f}".format(
+        "walk all users (peak)",
+        peak(lambda: walk(User.all())),
+        peak(lambda: walk(User.iter_all()))))
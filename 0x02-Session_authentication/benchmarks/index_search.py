@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Benchmark of User.search by email with and without the index.
+Run from the project root: python3 -m benchmarks.index_search
+"""
+import sys
+import time
+
+from models.base import DATA, INDEXES
+from models.user import User
+
+
+SIZES = [10000, 100000, 1000000]
+LOOKUPS = 1000
+
+
+def populate(size: int):
+    """Fill DATA with `size` users and rebuild the indexes.
+    """
+    DATA['User'] = {}
+    for i in range(size):
+        user = User(email='user{}@example.com'.format(i))
+        DATA['User'][user.id] = user
+    User.build_indexes()
+
+
+def time_lookups(size: int, lookups: int) -> float:
+    """Return the mean latency (in µs) of a search by email.
+    """
+    step = max(1, size // lookups)
+    start = time.perf_counter()
+    for i in range(0, step * lookups, step):
+        User.search({'email': 'user{}@example.com'.format(i % size)})
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print("{:>10} {:>15} {:>15}".format(
+        "users", "indexed (µs)", "linear (µs)"))
+    for size in sizes:
+        populate(size)
+        indexed = time_lookups(size, LOOKUPS)
+        indexes = INDEXES.pop('User')
+        linear = time_lookups(size, max(1, LOOKUPS * 1000 // size))
+        INDEXES['User'] = indexes
+        print("{:>10} {:>15.2f} {:>15.2f}".format(size, indexed, linear))
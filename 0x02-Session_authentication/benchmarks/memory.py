@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Benchmark of the memory used per User and UserSession object.
+"Before" replicates the previous __dict__-based models.
+Run from the project root: python3 -m benchmarks.memory
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from models.user import User
+from models.user_session import UserSession
+
+
+COUNT = 100000
+
+
+class DictUser():
+    """User as stored before __slots__.
+    """
+
+    def __init__(self, **kwargs):
+        """Initialize a DictUser like the previous User.
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+class DictUserSession():
+    """UserSession as stored before __slots__.
+    """
+
+    def __init__(self, **kwargs):
+        """Initialize a DictUserSession like the previous UserSession.
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def bytes_per_object(factory, count: int) -> float:
+    """Return the bytes allocated per object built by factory.
+    Field values are created beforehand so only the objects count.
+    """
+    values = ['value{}'.format(i) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(v) for v in values]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    print("{:>12} {:>12} {:>12}".format("model", "before (B)", "after (B)"))
+    for name, before, after in [
+            ('User', DictUser, User),
+            ('UserSession', DictUserSession, UserSession)]:
+        print("{:>12} {:>12.0f} {:>12.0f}".format(
+            name,
+            bytes_per_object(lambda v: before(email=v, user_id=v), count),
+            bytes_per_object(lambda v: after(email=v, user_id=v), count)))
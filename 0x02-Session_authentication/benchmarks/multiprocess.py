@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Cross-process coherence check of models.base with STORAGE_SHARED:
+several processes share the same files, each creates users, then
+every process must see the users of the others.
+Exits with status 1 if a process missed users.
+Run from the project root: python3 -m benchmarks.multiprocess
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+PROCESSES = 4
+USERS = 200
+
+
+def worker(n: int, barrier, results):
+    """Create USERS users, then check the users of every process.
+    """
+    from models.user import User
+
+    User.load_from_file()
+    barrier.wait()
+    start = time.time()
+    for i in range(USERS):
+        user = User(email='p{}u{}@example.com'.format(n, i))
+        user.save()
+    writes = time.time() - start
+    barrier.wait()
+    seen = User.count()
+    missing = 0
+    for p in range(PROCESSES):
+        for i in range(0, USERS, 10):
+            email = 'p{}u{}@example.com'.format(p, i)
+            if len(User.search({'email': email})) != 1:
+                missing += 1
+    start = time.time()
+    for i in range(10000):
+        User.count()
+    refresh = (time.time() - start) / 10000
+    results.put((n, seen, missing, USERS / writes, refresh))
+
+
+def run(max_size: int) -> bool:
+    """Run PROCESSES workers on fresh files (in journal mode,
+    as STORAGE_SHARED sets). Return True if every process saw
+    every user.
+    """
+    os.chdir(tempfile.mkdtemp())
+    os.environ['STORAGE_SHARED'] = '1'
+    os.environ['JOURNAL_MAX_SIZE'] = str(max_size)
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(PROCESSES)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(n, barrier, results))
+                 for n in range(PROCESSES)]
+    for p in processes:
+        p.start()
+    rows = sorted(results.get() for p in processes)
+    for p in processes:
+        p.join()
+    print("JOURNAL_MAX_SIZE={}:".format(max_size))
+    for n, seen, missing, writes, refresh in rows:
+        print("  process {}: {} users seen (expected {}), {} missing, "
+              "{:.0f} saves/s, {:.1f} us per unchanged refresh".format(
+                  n, seen, PROCESSES * USERS, missing, writes,
+                  refresh * 1e6))
+    return all(seen == PROCESSES * USERS and missing == 0
+               for n, seen, missing, writes, refresh in rows)
+
+
+if __name__ == "__main__":
+    # the workers import models from here, not from the data directory
+    os.environ['PYTHONPATH'] = os.getcwd()
+    ok = run(4194304)
+    ok = run(16384) and ok
+    if not ok:
+        sys.exit(1)
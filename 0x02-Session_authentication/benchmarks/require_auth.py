@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Microbenchmark of Auth.require_auth with 4, 100 and 1000 excluded
+paths: one regular expression built and matched per excluded path
+on every call (the first implementation), one alternation of all the
+paths compiled once (the second), and the PathTrie compiled once by
+compile_excluded_paths, as require_auth looks it up from the list and
+matched alone like the alternation.
+Run from the project root: python3 -m benchmarks.require_auth
+"""
+import re
+import sys
+import time
+
+from api.v1.auth.auth import Auth, compile_excluded_paths
+
+
+SIZES = [4, 100, 1000]
+CALLS = 20000
+PATHS = {
+    'authenticated': '/api/v1/users/me',
+    'excluded (first)': '/api/v1/status',
+    'excluded (last)': '/api/v1/public/route{}/page',
+}
+
+
+def excluded(size: int) -> list:
+    """Return the default excluded paths, then public routes
+    with each wildcard rule, size paths in all.
+    """
+    paths = ["/api/v1/status/", "/api/v1/unauthorized/",
+             "/api/v1/forbidden/", "/api/v1/auth_session/login/"]
+    i = 0
+    while len(paths) < size:
+        paths.append("/api/v1/public/route{}{}".format(
+            i, ('*', '/', '')[i % 3]))
+        i += 1
+    return paths[:size]
+
+
+def require_auth_loop(path: str, excluded_paths: list) -> bool:
+    """require_auth as it was: one pattern per excluded path.
+    """
+    i = 0
+    while i < len(excluded_paths):
+        exclusion_path = excluded_paths[i].strip()
+        if exclusion_path[-1] == '*':
+            pattern = '{}.*'.format(exclusion_path[0:-1])
+        elif exclusion_path[-1] == '/':
+            pattern = '{}/*'.format(exclusion_path[0:-1])
+        else:
+            pattern = '{}/*'.format(exclusion_path)
+        if re.match(pattern, path):
+            return False
+        i += 1
+    return True
+
+
+def compile_alternation(excluded_paths: list):
+    """Return the alternation regular expression of the excluded
+    paths, as compile_excluded_paths built it before the PathTrie.
+    """
+    patterns = []
+    for exclusion_path in excluded_paths:
+        exclusion_path = exclusion_path.strip()
+        if exclusion_path[-1] == '*':
+            pattern = '{}.*'.format(exclusion_path[0:-1])
+        elif exclusion_path[-1] == '/':
+            pattern = '{}/*'.format(exclusion_path[0:-1])
+        else:
+            pattern = '{}/*'.format(exclusion_path)
+        patterns.append('(?:{})'.format(pattern))
+    return re.compile('|'.join(patterns))
+
+
+def timed(function, path: str, excluded_paths: list) -> float:
+    """Return the mean latency (in µs) of function(path, excluded),
+    over fewer calls for longer lists.
+    """
+    calls = max(100, CALLS * 4 // len(excluded_paths))
+    start = time.perf_counter()
+    for i in range(calls):
+        function(path, excluded_paths)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    auth = Auth()
+    print("{:>6} {:>18} {:>10} {:>10} {:>10} {:>10}".format(
+        "paths", "request", "loop µs", "regex µs", "list µs", "trie µs"))
+    for size in sizes:
+        paths = excluded(size)
+        regex = compile_alternation(paths)
+        trie = compile_excluded_paths(paths)
+        for name, path in PATHS.items():
+            path = path.format(size - 5)
+            expected = require_auth_loop(path, paths)
+            assert (regex.match(path) is None) == expected
+            assert auth.require_auth(path, trie) == expected
+            print(("{:>6} {:>18}" + " {:>10.2f}" * 4).format(
+                size, name, timed(require_auth_loop, path, paths),
+                timed(lambda p, e: regex.match(p) is None, path, paths),
+                timed(auth.require_auth, path, paths),
+                timed(lambda p, e: not trie.match(p), path, paths)))
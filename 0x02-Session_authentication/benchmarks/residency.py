@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Benchmark of the object cache (STORAGE_CACHE_SIZE): memory held
+after load and after a skewed User.get workload, per user too, hit
+rate and time per get, for several cache sizes.
+The cache limits the objects built, not memory: the IDs, Rows and
+index entries of all users remain, the floor of the bytes per user.
+Run from the project root: python3 -m benchmarks.residency [users]
+"""
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from models import base
+from models.user import User
+
+
+USERS = 100000
+GETS = 200000
+
+
+def load(cache_size: int):
+    """Load the users with cache_size objects (0: all built at load).
+    """
+    base.STORAGE_CACHE_SIZE = cache_size
+    base.DATA.pop('User', None)
+    gc.collect()
+    User.load_from_file()
+
+
+def run(cache_size: int, keys: list) -> tuple:
+    """Return (MB after load, MB after the gets, us per get, hit rate)
+    with cache_size objects.
+    """
+    tracemalloc.start()
+    load(cache_size)
+    loaded = tracemalloc.get_traced_memory()[0]
+    for key in keys:
+        User.get(key)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    load(cache_size)
+    start = time.perf_counter()
+    for key in keys:
+        User.get(key)
+    elapsed = time.perf_counter() - start
+    stats = User.cache_stats() or {'hits': len(keys), 'misses': 0}
+    hits = stats['hits'] / max(1, stats['hits'] + stats['misses'])
+    return loaded / 1e6, used / 1e6, elapsed / len(keys) * 1e6, hits
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    os.chdir(tempfile.mkdtemp())
+    User.load_from_file()
+    for i in range(users):
+        user = User(email='user{}@example.com'.format(i))
+        user.password = 'pwd'
+        base.DATA['User'][user.id] = user
+    User.save_to_file()
+    ids = list(base.DATA['User'].keys())
+    # 90% of the gets go to 1% of the users
+    rnd = random.Random(0)
+    hot = ids[:len(ids) // 100]
+    keys = [rnd.choice(hot) if rnd.random() < 0.9 else rnd.choice(ids)
+            for i in range(GETS)]
+    print("{} users, {} gets".format(users, GETS))
+    print("{:>13} {:>12} {:>12} {:>10} {:>10} {:>9}".format(
+        "cache_size", "loaded (MB)", "used (MB)", "B/user", "get (us)",
+        "hit rate"))
+    for cache_size in (0, users // 10, users // 100, users // 1000):
+        loaded, used, get, hits = run(cache_size, keys)
+        print("{:>13} {:>12.1f} {:>12.1f} {:>10.0f} {:>10.2f} {:>9.1%}".format(
+            cache_size, loaded, used, used * 1e6 / users, get, hits))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Benchmark of the GET /users body: to_json + json.dumps of the list
+(previous view) against the cached encoded JSON of each user.
+Run from the project root: python3 -m benchmarks.serialize
+"""
+import json
+import sys
+import time
+
+from models.user import User
+
+
+COUNT = 100000
+ROUNDS = 5
+
+
+def previous_body(users: list) -> bytes:
+    """Render the list like jsonify([u.to_json() for u in users]).
+    Caches are dropped first so every user is serialized again.
+    """
+    for user in users:
+        object.__setattr__(user, '_cache', None)
+    return json.dumps([u.to_json() for u in users], sort_keys=True).encode()
+
+
+def cached_body(users: list) -> bytes:
+    """Render the list like view_all_users does.
+    """
+    return b'[' + b', '.join(u.to_json_bytes() for u in users) + b']\n'
+
+
+def cpu_time(render, users: list) -> float:
+    """Return the mean CPU time (in ms) of one rendering.
+    """
+    start = time.process_time()
+    for i in range(ROUNDS):
+        render(users)
+    return (time.process_time() - start) / ROUNDS * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    users = []
+    for i in range(count):
+        user = User(email='user{}@example.com'.format(i), first_name='F')
+        user.password = 'pwd'
+        users.append(user)
+    assert json.loads(previous_body(users)) == json.loads(cached_body(users))
+    print("{} users".format(count))
+    print("previous: {:.1f} ms".format(cpu_time(previous_body, users)))
+    cached_body(users)
+    print("cached:   {:.1f} ms".format(cpu_time(cached_body, users)))
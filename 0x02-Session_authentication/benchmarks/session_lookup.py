@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Benchmark of authenticated GET /api/v1/users/me requests through
+the app (app.test_client()) under SessionDBAuth at 100k live sessions:
+reading UserSession on every request against the session map of
+SessionDBAuth, plus requests with a bogus cookie (403).
+Run from the project root: python3 -m benchmarks.session_lookup [sessions]
+"""
+import importlib
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from uuid import uuid4
+
+
+SESSIONS = 100000
+USERS = 1000
+REQUESTS = 20000
+REPEATS = 3
+
+
+def populate(sessions: int) -> list:
+    """Fill DATA with USERS users and their sessions,
+    and return the session IDs.
+    """
+    base = importlib.import_module('models.base')
+    User = importlib.import_module('models.user').User
+    UserSession = importlib.import_module('models.user_session').UserSession
+    base.DATA['User'] = {}
+    base.DATA['UserSession'] = {}
+    users = []
+    for i in range(USERS):
+        user = User(email='user{}@example.com'.format(i))
+        base.DATA['User'][user.id] = user
+        users.append(user.id)
+    session_ids = []
+    now = datetime.now()
+    for i in range(sessions):
+        session = UserSession(user_id=users[i % USERS],
+                              session_id=str(uuid4()), created_at=now)
+        base.DATA['UserSession'][session.id] = session
+        session_ids.append(session.session_id)
+    User.build_indexes()
+    UserSession.build_indexes()
+    return session_ids
+
+
+def storage_lookup(self, request=None):
+    """Resolve the user the way SessionDBAuth did before its session
+    map: one UserSession read per request.
+    """
+    User = importlib.import_module('models.user').User
+    UserSession = importlib.import_module('models.user_session').UserSession
+    session_id = self.session_cookie(request)
+    session = UserSession.first({'session_id': session_id})
+    if session is not None:
+        return User.get(session.user_id)
+    return None
+
+
+def run(client, session_ids: list, status: int,
+        repeats: int = REPEATS) -> float:
+    """Return the GET /api/v1/users/me per second, one per session
+    ID, each answered with status: the best of repeats passes.
+    """
+    name = os.environ['SESSION_NAME']
+    best = 0.0
+    for i in range(repeats):
+        start = time.perf_counter()
+        for session_id in session_ids:
+            client.set_cookie(name, session_id)
+            response = client.get('/api/v1/users/me')
+            assert response.status_code == status, response.status_code
+        best = max(best, len(session_ids) / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    """Run the benchmark; the app reads the environment at import,
+    so it is imported once it is set.
+    """
+    os.environ['AUTH_TYPE'] = 'session_db_auth'
+    os.environ.setdefault('SESSION_NAME', '_my_session_id')
+    os.environ.setdefault('SESSION_DURATION', '3600')
+    os.chdir(tempfile.mkdtemp())
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else SESSIONS
+    app = importlib.import_module('api.v1.app')
+    session_ids = populate(sessions)
+    SessionDBAuth = importlib.import_module(
+        'api.v1.auth.session_db_auth').SessionDBAuth
+    StorageLookupAuth = type('StorageLookupAuth', (SessionDBAuth,),
+                             {'current_user': storage_lookup})
+    client = app.app.test_client()
+    requests = [session_ids[i * 7919 % sessions] for i in range(REQUESTS)]
+    bogus = [str(uuid4()) for i in range(100)] * (REQUESTS // 100)
+    session_map = app.auth
+    print("{} sessions, {} requests".format(sessions, REQUESTS))
+    app.auth = StorageLookupAuth()
+    print("{:>34} {:>12.0f} req/s".format(
+        "UserSession read per request", run(client, requests, 200)))
+    print("{:>34} {:>12.0f} req/s".format(
+        "bogus cookie, no negative cache", run(client, bogus, 403)))
+    app.auth = session_map
+    print("{:>34} {:>12.0f} req/s".format(
+        "session map (first touch)", run(client, requests, 200, 1)))
+    print("{:>34} {:>12.0f} req/s".format(
+        "session map (warm)", run(client, requests, 200)))
+    print("{:>34} {:>12.0f} req/s".format(
+        "bogus cookie, negative cache", run(client, bogus, 403)))
+
+
+if __name__ == "__main__":
+    main()
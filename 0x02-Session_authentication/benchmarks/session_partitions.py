@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark of time-partitioned UserSession storage: save latency
+in file mode, expiry of old sessions, and the cost of an unchanged
+STORAGE_SHARED refresh (directory listing cached or not), with one
+snapshot file (partition_seconds = 0) against hourly partitions.
+Run from the project root: python3 -m benchmarks.session_partitions
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from models import base
+from models.user_session import UserSession
+
+
+SESSIONS = 5000
+HOURS = 48
+SAVES = 20
+REFRESHES = 2000
+
+
+def populate(sessions: int):
+    """Fill DATA with sessions last saved over the last HOURS hours,
+    then write the snapshot.
+    """
+    os.chdir(tempfile.mkdtemp())
+    base.DATA['UserSession'] = {}
+    base.DIRTY.pop('UserSession', None)
+    now = datetime.utcnow()
+    for i in range(sessions):
+        saved_at = now - timedelta(seconds=HOURS * 3600 * i // sessions)
+        session = UserSession(user_id=str(i), session_id=str(i),
+                              created_at=saved_at, updated_at=saved_at)
+        base.DATA['UserSession'][session.id] = session
+    UserSession.build_indexes()
+    UserSession.save_to_file()
+
+
+def run(partition_seconds: int, sessions: int) -> tuple:
+    """Return (ms per save, ms to expire the sessions older than a day)
+    with partition_seconds.
+    """
+    UserSession.partition_seconds = partition_seconds
+    populate(sessions)
+    start = time.perf_counter()
+    for i in range(SAVES):
+        UserSession(user_id='u', session_id='s{}'.format(i)).save()
+    save = (time.perf_counter() - start) / SAVES * 1e3
+
+    before = datetime.utcnow() - timedelta(hours=24)
+    start = time.perf_counter()
+    if partition_seconds:
+        UserSession.drop_partitions(before)
+    else:
+        # without partitions: remove the expired sessions one by one
+        for session in UserSession.query('updated_at', end=before):
+            session.remove()
+    expire = (time.perf_counter() - start) * 1e3
+    return save, expire
+
+
+def refresh_cost() -> tuple:
+    """Return the us per unchanged refresh of UserSession with
+    STORAGE_SHARED (in journal mode, as it sets), listing the directory
+    every time, then with the listing cached (once the directory
+    settled).
+    """
+    base.STORAGE_SHARED = True
+    base.STORAGE_MODE = 'journal'
+    UserSession.load_from_file()
+    time.sleep(base.LISTING_SETTLE_NS / 1e9 + 0.1)
+    costs = []
+    for cached in (False, True):
+        start = time.perf_counter()
+        for i in range(REFRESHES):
+            if not cached:
+                base.LISTINGS.clear()
+            UserSession._refresh()
+        costs.append((time.perf_counter() - start) / REFRESHES * 1e6)
+    base.STORAGE_SHARED = False
+    base.STORAGE_MODE = 'file'
+    return tuple(costs)
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else SESSIONS
+    base.STORAGE_MODE = 'file'
+    base.STORAGE_DURABILITY = 'sync'
+    print("{} sessions over {} hours, file mode".format(sessions, HOURS))
+    print("{:>18} {:>10} {:>12} {:>14} {:>14}".format(
+        "partition_seconds", "save (ms)", "expire (ms)", "refresh (us)",
+        "cached (us)"))
+    for partition_seconds in (0, 3600):
+        save, expire = run(partition_seconds, sessions)
+        listed, cached = refresh_cost()
+        print("{:>18} {:>10.2f} {:>12.1f} {:>14.1f} {:>14.1f}".format(
+            partition_seconds, save, expire, listed, cached))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Benchmark of login/logout throughput on the in-memory session map
+with 1, 4, 16 and 64 threads: a dict behind one lock, against the
+LockedSessionStore of the session auths (the same, plus the index of
+the sessions of each user), then through the auth classes
+(create_session, two lookups, destroy_session): SessionAuth, and
+SessionExpAuth with SESSION_DURATION sweeping under the heap lock on
+every call (as it did) or after an unlocked peek.
+Each login stores a session, checks it twice, and logs out.
+Run from the project root: python3 -m benchmarks.session_store
+"""
+import heapq
+import importlib
+import os
+import sys
+import threading
+import time
+from uuid import uuid4
+
+
+THREADS = [1, 4, 16, 64]
+CYCLES = 200000
+
+
+class LockedDict(dict):
+    """Session map behind one lock for every write.
+    """
+
+    def __init__(self):
+        """Initialize an empty LockedDict.
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        """Store a session under the lock.
+        """
+        with self._lock:
+            dict.__setitem__(self, key, value)
+
+    def pop(self, key, default=None):
+        """Remove a session under the lock.
+        """
+        with self._lock:
+            return dict.pop(self, key, default)
+
+
+def locked_sweep(self, now=None) -> int:
+    """Evict the sessions expired at now, under the heap lock
+    (the sweep of SessionExpAuth as it was).
+    """
+    cls = type(self).__mro__[1]
+    if now is None:
+        now = self._now()
+    evicted = 0
+    with cls.expirations_lock:
+        heap = cls.expirations
+        while len(heap) > 0 and heap[0][0] < now:
+            heapq.heappop(heap)
+            evicted += 1
+    return evicted
+
+
+class Request():
+    """Request with a session cookie.
+    """
+
+    def __init__(self, session_id: str):
+        """Initialize a Request with a session cookie.
+        """
+        self.cookies = {os.environ['SESSION_NAME']: session_id}
+        self.headers = {}
+
+
+def auth_worker(auth, ids: list):
+    """Log in and out once per user ID, through the auth.
+    """
+    for user_id in ids:
+        session_id = auth.create_session(user_id)
+        auth.user_id_for_session_id(session_id)
+        auth.user_id_for_session_id(session_id)
+        auth.destroy_session(Request(session_id))
+
+
+def worker(store, ids: list):
+    """Log in and out once per session ID.
+    """
+    for session_id in ids:
+        store[session_id] = {'user_id': session_id}
+        store.get(session_id)
+        session_id in store
+        store.pop(session_id)
+
+
+def run(store, threads: int, target=worker) -> float:
+    """Return the login/logout cycles per second.
+    """
+    ids = [str(uuid4()) for i in range(CYCLES)]
+    size = CYCLES // threads
+    workers = [threading.Thread(target=target,
+                                args=(store, ids[i * size:(i + 1) * size]))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return size * threads / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark; the auth modules read the environment
+    at import, so they are imported once it is set.
+    """
+    os.environ.setdefault('SESSION_NAME', '_my_session_id')
+    os.environ.setdefault('SESSION_DURATION', '3600')
+    store = importlib.import_module('api.v1.auth.session_store')
+    SessionAuth = importlib.import_module(
+        'api.v1.auth.session_auth').SessionAuth
+    SessionExpAuth = importlib.import_module(
+        'api.v1.auth.session_exp_auth').SessionExpAuth
+    LockedSweepAuth = type('LockedSweepAuth', (SessionExpAuth,),
+                           {'sweep': locked_sweep})
+    threads = [int(arg) for arg in sys.argv[1:]] or THREADS
+    print("{:>8} {:>14} {:>14}".format(
+        "threads", "one lock/s", "store/s"))
+    for n in threads:
+        print("{:>8} {:>14.0f} {:>14.0f}".format(
+            n, run(LockedDict(), n), run(store.LockedSessionStore(), n)))
+    print("{:>8} {:>14} {:>14} {:>14}".format(
+        "threads", "SessionAuth/s", "locked sweep/s", "peek sweep/s"))
+    for n in threads:
+        print("{:>8} {:>14.0f} {:>14.0f} {:>14.0f}".format(
+            n, run(SessionAuth(), n, auth_worker),
+            run(LockedSweepAuth(), n, auth_worker),
+            run(SessionExpAuth(), n, auth_worker)))
+
+
+if __name__ == "__main__":
+    main()
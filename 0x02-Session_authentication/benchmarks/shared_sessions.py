@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Cross-process check of AUTH_TYPE=session_shared_auth on its SQLite
+session store: several processes share one database file, each logs
+in sessions through SessionSharedAuth.create_session, then every
+process must resolve the sessions of the others
+(user_id_for_session_id), the logouts of each (destroy_session) must
+be seen by all the others, and the expired sessions must go in one
+sweep. Needs no external service.
+Run from the project root: python3 -m benchmarks.shared_sessions
+"""
+import importlib
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+
+PROCESSES = 4
+SESSIONS = 500
+DURATION = 60
+
+
+class Request():
+    """Request with a session cookie.
+    """
+
+    def __init__(self, session_id: str):
+        """Initialize a Request with a session cookie.
+        """
+        self.cookies = {os.environ['SESSION_NAME']: session_id}
+        self.headers = {}
+
+
+def user_id(n: int, i: int) -> str:
+    """Return the ID of the user i of process n.
+    """
+    return 'p{}u{}'.format(n, i)
+
+
+def worker(n: int, barrier, session_ids, results):
+    """Log in SESSIONS users, resolve the sessions of every process,
+    log out the odd ones, check them again, and expire the others.
+    """
+    SessionSharedAuth = importlib.import_module(
+        'api.v1.auth.session_shared_auth').SessionSharedAuth
+
+    auth = SessionSharedAuth()
+    barrier.wait()
+    start = time.time()
+    ids = [auth.create_session(user_id(n, i)) for i in range(SESSIONS)]
+    logins = SESSIONS / (time.time() - start)
+    session_ids[n] = ids
+    barrier.wait()
+    everyone = {p: session_ids[p] for p in range(PROCESSES)}
+    missing = 0
+    start = time.time()
+    for p, p_ids in everyone.items():
+        for i, session_id in enumerate(p_ids):
+            if auth.user_id_for_session_id(session_id) != user_id(p, i):
+                missing += 1
+    lookups = PROCESSES * SESSIONS / (time.time() - start)
+    barrier.wait()
+    start = time.time()
+    for i in range(1, SESSIONS, 2):
+        auth.destroy_session(Request(ids[i]))
+    logouts = (SESSIONS // 2) / (time.time() - start)
+    barrier.wait()
+    stale = 0
+    for p, p_ids in everyone.items():
+        for i in range(1, SESSIONS, 2):
+            if auth.user_id_for_session_id(p_ids[i]) is not None:
+                stale += 1
+    barrier.wait()
+    # backdate the even sessions of this process past their expiration
+    store = auth.user_id_by_session_id
+    old = auth._now() - timedelta(seconds=2 * DURATION)
+    for i in range(0, SESSIONS, 2):
+        store[ids[i]] = {'user_id': user_id(n, i), 'created_at': old}
+    barrier.wait()
+    if n == 0:
+        auth.next_sweep = 0.0
+        start = time.time()
+        expired = auth.sweep()
+        print("  one sweep() deleted {} sessions in {:.1f} ms".format(
+            expired, (time.time() - start) * 1e3))
+    barrier.wait()
+    alive = 0
+    for p, p_ids in everyone.items():
+        for i in range(0, SESSIONS, 2):
+            if auth.user_id_for_session_id(p_ids[i]) is not None:
+                alive += 1
+    results.put((n, missing, stale, alive, len(store), logins, lookups,
+                 logouts))
+
+
+def main():
+    """Run PROCESSES workers on one fresh session store.
+    """
+    # the workers import api from here, not from the data directory
+    os.environ['PYTHONPATH'] = os.getcwd()
+    os.environ['SESSION_NAME'] = '_my_session_id'
+    os.environ['SESSION_DURATION'] = str(DURATION)
+    os.environ['SESSION_STORE'] = 'sqlite'
+    os.environ['SESSION_STORE_PATH'] = os.path.join(tempfile.mkdtemp(),
+                                                    'sessions.sqlite3')
+    ctx = multiprocessing.get_context('spawn')
+    manager = ctx.Manager()
+    session_ids = manager.dict()
+    barrier = ctx.Barrier(PROCESSES)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker,
+                             args=(n, barrier, session_ids, results))
+                 for n in range(PROCESSES)]
+    for p in processes:
+        p.start()
+    rows = sorted(results.get() for p in processes)
+    for p in processes:
+        p.join()
+    manager.shutdown()
+    failed = False
+    for n, missing, stale, alive, left, logins, lookups, logouts in rows:
+        print("  process {}: {} sessions missing, {} logged out seen, "
+              "{} expired seen, {} left, {:.0f} logins/s, "
+              "{:.0f} lookups/s, {:.0f} logouts/s".format(
+                  n, missing, stale, alive, left, logins, lookups,
+                  logouts))
+        failed = failed or missing > 0 or stale > 0 or alive > 0 or \
+            left > 0
+    print("FAILED" if failed else "ok")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Benchmark of User.load_from_file per snapshot format, each
+written in its own directory (a snapshot replaces the other format).
+Run from the project root: python3 -m benchmarks.startup
+"""
+import os
+import sys
+import tempfile
+import time
+
+from models import base
+from models.user import User
+
+
+SIZES = [100000, 1000000]
+FORMATS = ['json', 'binary']
+
+
+def write_snapshots(size: int) -> dict:
+    """Write a JSON and a binary snapshot of `size` users, and
+    return the directory of each format.
+    """
+    base.DATA['User'] = {}
+    for i in range(size):
+        user = User(email='user{}@example.com'.format(i))
+        user.password = 'pwd'
+        base.DATA['User'][user.id] = user
+    directories = {}
+    for storage_format in FORMATS:
+        directories[storage_format] = tempfile.mkdtemp()
+        os.chdir(directories[storage_format])
+        base.STORAGE_FORMAT = storage_format
+        User.save_to_file()
+    return directories
+
+
+def time_load(directory: str, storage_format: str, lazy: bool) -> float:
+    """Return the duration (in s) of a cold User.load_from_file.
+    """
+    os.chdir(directory)
+    base.STORAGE_FORMAT = storage_format
+    base.STORAGE_LAZY_LOAD = lazy
+    base.DATA['User'] = {}
+    start = time.perf_counter()
+    User.load_from_file()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print("{:>10} {:>8} {:>6} {:>10}".format(
+        "users", "format", "lazy", "load (s)"))
+    for size in sizes:
+        directories = write_snapshots(size)
+        for storage_format in FORMATS:
+            for lazy in [False, True]:
+                duration = time_load(directories[storage_format],
+                                     storage_format, lazy)
+                print("{:>10} {:>8} {:>6} {:>10.3f}".format(
+                    size, storage_format, str(lazy), duration))
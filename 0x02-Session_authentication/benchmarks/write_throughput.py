@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Benchmark of UserSession.save throughput per durability setting.
+Run from the project root: python3 -m benchmarks.write_throughput
+"""
+import os
+import sys
+import tempfile
+import time
+
+from models import base
+from models.user_session import UserSession
+
+
+TABLE_SIZE = 10000
+WRITES = 2000
+
+
+def run(storage_mode: str, durability: str, table_size: int) -> float:
+    """Return the number of saves per second, final flush included.
+    """
+    os.chdir(tempfile.mkdtemp())
+    base.STORAGE_MODE = storage_mode
+    base.STORAGE_DURABILITY = durability
+    base.DATA['UserSession'] = {}
+    for i in range(table_size):
+        session = UserSession(user_id=str(i), session_id=str(i))
+        base.DATA['UserSession'][session.id] = session
+    UserSession.build_indexes()
+    UserSession.save_to_file()
+
+    writes = WRITES if storage_mode == 'journal' or durability != 'sync' \
+        else max(10, WRITES * 100 // table_size)
+    start = time.perf_counter()
+    for i in range(writes):
+        UserSession(user_id='u', session_id='s{}'.format(i)).save()
+    base.flush()
+    return writes / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    table_size = int(sys.argv[1]) if len(sys.argv) > 1 else TABLE_SIZE
+    print("{} existing sessions, FLUSH_MAX_PENDING={}".format(
+        table_size, base.FLUSH_MAX_PENDING))
+    print("{:>10} {:>10} {:>15}".format("storage", "durability", "saves/s"))
+    for storage_mode in ['file', 'journal']:
+        for durability in ['sync', 'batched', 'async']:
+            rate = run(storage_mode, durability, table_size)
+            print("{:>10} {:>10} {:>15.0f}".format(
+                storage_mode, durability, rate))
@@ -1,20 +1,191 @@
 #!/usr/bin/env python3
 """Base module.
 """
+import atexit
+import bisect
 import json
+import os
+import threading
+import time
 import uuid
+from contextlib import nullcontext
 from os import path
-from datetime import datetime
-from typing import TypeVar, List, Iterable
+from datetime import datetime, timedelta
+from itertools import count, islice
+from typing import Callable, TypeVar, List, Iterable, Iterator, Tuple
+
+from models import journal, snapshot
+from models.filelock import FileLock
+from models.lazy import LazyTable, Row
+from models.rwlock import RWLock
+from models.storage import load_storage
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+STORAGE_MODE = os.getenv('STORAGE_MODE', 'file')
+try:
+    JOURNAL_MAX_SIZE = int(os.getenv('JOURNAL_MAX_SIZE', '4194304'))
+except Exception:
+    JOURNAL_MAX_SIZE = 4194304
+STORAGE_FORMAT = os.getenv('STORAGE_FORMAT', 'json')
+STORAGE_LAZY_LOAD = os.getenv('STORAGE_LAZY_LOAD', '') in ('1', 'true')
+try:
+    # a limit of the objects kept built, not of memory
+    STORAGE_CACHE_SIZE = int(os.getenv('STORAGE_CACHE_SIZE', '0'))
+except Exception:
+    STORAGE_CACHE_SIZE = 0
+STORAGE_SHARED = os.getenv('STORAGE_SHARED', '') in ('1', 'true')
+if STORAGE_SHARED:
+    # the other processes catch up by replaying the journal records
+    # appended since their last look: in file mode every save rewrites
+    # the snapshot, and would make all of them reload the whole class
+    STORAGE_MODE = 'journal'
+STORAGE_DURABILITY = os.getenv('STORAGE_DURABILITY', 'sync')
+try:
+    FLUSH_INTERVAL = float(os.getenv('FLUSH_INTERVAL', '1'))
+except Exception:
+    FLUSH_INTERVAL = 1.0
+try:
+    FLUSH_MAX_PENDING = int(os.getenv('FLUSH_MAX_PENDING', '100'))
+except Exception:
+    FLUSH_MAX_PENDING = 100
+STORAGE = load_storage(os.getenv('STORAGE_BACKEND', 'file'))
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+POSITIONS = count()
+UNSAVED = {}
+ORDERED = {}
+SHARED_STATE = {}
+LISTINGS = {}
+LISTING_SETTLE_NS = 2 * 10 ** 9
+ITERATORS = {}
+ITER_CHUNK = 1000
+DIRTY = {}
+FIELDS = {}
+PENDING = {}
+PENDING_LOCK = threading.Lock()
+FLUSH_EVENT = threading.Event()
+FLUSHER = None
+LOCKS = {}
+LOCKS_LOCK = threading.Lock()
+
+
+def _class_locks(s_class: str) -> Tuple[RWLock, threading.RLock]:
+    """Return the locks of a class: the RWLock guarding its objects
+    and indexes (shared by get/search/query, held alone by
+    save/remove/load), and the lock serializing its file writes,
+    across processes with STORAGE_SHARED.
+    """
+    locks = LOCKS.get(s_class)
+    if locks is None:
+        with LOCKS_LOCK:
+            if STORAGE_SHARED:
+                file_lock = FileLock(".db_{}.lock".format(s_class))
+            else:
+                file_lock = threading.RLock()
+            locks = LOCKS.setdefault(s_class, (RWLock(), file_lock))
+    return locks
+
+
+def _file_signature(file_path: str) -> Tuple[int, int, int]:
+    """Return the (inode, mtime, size) of a file, or None.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def flush():
+    """Write every pending mutation to disk, one class at a time.
+    Never called with the file lock of a class held: it takes them all.
+    """
+    with PENDING_LOCK:
+        classes = [cls for cls, records in PENDING.values()]
+    for cls in classes:
+        cls._flush()
+
+
+def _flusher_loop():
+    """Flush pending mutations every FLUSH_INTERVAL seconds,
+    or sooner when FLUSH_MAX_PENDING of them are waiting.
+    """
+    while True:
+        FLUSH_EVENT.wait(FLUSH_INTERVAL)
+        FLUSH_EVENT.clear()
+        flush()
+
+
+def _start_flusher():
+    """Start the background flusher once.
+    """
+    global FLUSHER
+    with PENDING_LOCK:
+        if FLUSHER is not None:
+            return
+        FLUSHER = threading.Thread(target=_flusher_loop, daemon=True)
+        FLUSHER.start()
+
+
+atexit.register(flush)
+
+
+def _now() -> datetime:
+    """Return the current UTC time, truncated to the stored precision
+    (seconds): objects reloaded or rebuilt from their stored form keep
+    the timestamps, index keys and cursors they had in memory.
+    """
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def _indexed_slot(slot) -> property:
+    """Return the property replacing the slot of an indexed attribute:
+    read through the slot, set through it then, on a stored object
+    whose indexed value changes, recorded in UNSAVED: the object is
+    searched outside of the indexes until its next save.
+    """
+    name = slot.__name__
+
+    def setter(obj, value):
+        slot.__set__(obj, value)
+        s_class = obj.__class__.__name__
+        values = INDEXED_VALUES.get(s_class, {}).get(obj.id)
+        if values is not None and values.get(name) != value and \
+                dict.get(DATA[s_class], obj.id) is obj:
+            UNSAVED[s_class].add(obj.id)
+
+    return property(slot.__get__, setter, doc=slot.__doc__)
+
+
+def _to_datetime(value, now: datetime) -> datetime:
+    """Return a datetime from a stored timestamp (string or datetime),
+    or now if there is none.
+    """
+    if value is None:
+        return now
+    if type(value) is datetime:
+        return value
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
 
 
 class Base():
     """Base class.
+    Attributes are stored in __slots__ (no per-instance __dict__),
+    so every subclass declares the attributes it adds.
+    Serialized forms are cached in `_cache` until the object is saved
+    (code changing an object it does not save resets `_cache`).
+    Indexed attributes have a setter recording the changes of stored
+    objects (see _indexed_slot); other attributes are plain slots.
+    With `partition_seconds`, the snapshot is split in one file per
+    period of `partition_attribute` (see drop_partitions).
     """
+    __slots__ = ('id', 'created_at', 'updated_at', '_cache')
+    indexed_attributes = ()
+    ordered_attributes = ('created_at', 'updated_at')
+    partition_seconds = 0
+    partition_attribute = 'created_at'
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a Base instance.
@@ -23,17 +194,54 @@ class Base():
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+        if 'id' in kwargs:
+            self.id = kwargs['id']
         else:
-            self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.updated_at = datetime.utcnow()
+            self.id = str(uuid.uuid4())
+        created_at = kwargs.get('created_at')
+        updated_at = kwargs.get('updated_at')
+        now = None
+        if created_at is None or updated_at is None:
+            now = _now()
+        self.created_at = _to_datetime(created_at, now)
+        self.updated_at = _to_datetime(updated_at, now)
+
+    def __init_subclass__(cls, **kwargs):
+        """Give the indexed attributes declared in the __slots__ of
+        the class their setter.
+        """
+        super().__init_subclass__(**kwargs)
+        for name in cls.__dict__.get('__slots__', ()):
+            if name in cls.indexed_attributes:
+                setattr(cls, name, _indexed_slot(cls.__dict__[name]))
+
+    @classmethod
+    def fields(cls) -> tuple:
+        """Return the names of the stored attributes of the class,
+        from the __slots__ of its hierarchy.
+        """
+        names = FIELDS.get(cls)
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get('__slots__', ()):
+                    if name not in names and \
+                            name not in ('__dict__', '_cache'):
+                        names.append(name)
+            names = FIELDS[cls] = tuple(names)
+        return names
+
+    def attributes(self) -> dict:
+        """Return the stored attributes of the object.
+        """
+        result = {}
+        for key in self.__class__.fields():
+            try:
+                result[key] = getattr(self, key)
+            except AttributeError:
+                continue
+        result.update(getattr(self, '__dict__', {}))
+        return result
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """Equality.
@@ -44,70 +252,810 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def _cached(self) -> dict:
+        """Return the cache of serialized forms of the object.
+        """
+        cache = getattr(self, '_cache', None)
+        if cache is None:
+            cache = self._cache = {}
+        return cache
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """Convert the object a JSON dictionary.
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
+        cache = self._cached()
+        result = cache.get(for_serialization)
+        if result is None:
+            result = {}
+            for key, value in self.attributes().items():
+                if not for_serialization and key[0] == '_':
+                    continue
+                if type(value) is datetime:
+                    result[key] = value.strftime(TIMESTAMP_FORMAT)
+                else:
+                    result[key] = value
+            cache[for_serialization] = result
+        return dict(result)
+
+    def to_json_bytes(self) -> bytes:
+        """Return the encoded JSON representation of the object,
+        as jsonify would render it.
+        """
+        cache = self._cached()
+        result = cache.get('bytes')
+        if result is None:
+            result = json.dumps(self.to_json(), sort_keys=True).encode()
+            cache['bytes'] = result
         return result
 
     @classmethod
     def load_from_file(cls):
-        """Load all objects from file.
+        """Load all objects from the snapshot file, then replay
+        the mutations recorded in the journal after it.
+        With STORAGE_LAZY_LOAD, snapshot objects are only built
+        on first access.
+        With STORAGE_CACHE_SIZE, built snapshot objects are a cache of
+        that many objects (LRU); the others are read back from the
+        snapshot on access. It limits the objects built, not memory:
+        every object keeps its ID, its place in the snapshot and its
+        index entries, most of the size of a small object such as
+        a User.
         """
+        if STORAGE is not None:
+            return STORAGE.load(cls)
+        cls._flush()
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        state = {
+            'snapshot': cls._snapshot_signature(),
+            'journal': _file_signature(cls._journal_path()),
+        }
+        rows, dirty = cls._read_rows()
+
+        if STORAGE_CACHE_SIZE > 0:
+            objs = LazyTable(cls, rows, STORAGE_CACHE_SIZE)
+        elif STORAGE_LAZY_LOAD:
+            objs = LazyTable(cls, rows)
+        else:
+            objs = {}
+            for obj_id, row in rows.items():
+                objs[obj_id] = cls(**row.kwargs())
+
+        with _class_locks(s_class)[0].writing():
+            records, state['offset'] = journal.read(cls._journal_path())
+            DIRTY[s_class] = dirty
+            cls._replay(objs, records)
+            DATA[s_class] = objs
+            SHARED_STATE[s_class] = state
+            cls.build_indexes()
+        if STORAGE_CACHE_SIZE > 0:
+            # indexed: from now on, cold objects are read from the file
+            for row in rows.values():
+                if type(row) is snapshot.JSONRow:
+                    row.release()
+
+    @classmethod
+    def _read_rows(cls) -> Tuple[dict, set]:
+        """Return the Rows (by ID) of the snapshot and the partitions
+        of the class, and the set of partitions changed since (empty),
+        or None when the files must all be rewritten.
+        """
+        rows = cls._read_snapshot()
+        partitions = cls._partitions()
+        # files of another layout are all rewritten by the next snapshot
+        if (len(rows) > 0 and cls.partition_seconds) or \
+                (len(partitions) > 0 and not cls.partition_seconds):
+            dirty = None
+        else:
+            dirty = set()
+        for partition in partitions:
+            part_rows = cls._read_snapshot(partition)
+            if dirty is not None and cls._misplaced(part_rows, partition):
+                dirty = None
+            rows.update(part_rows)
+        return rows, dirty
+
+    @classmethod
+    def _read_files(cls) -> dict:
+        """Return the objects (by ID) stored in the files of the class,
+        read as load_from_file does: the snapshot and its partitions
+        in either format, then the journal replayed.
+        """
+        rows, dirty = cls._read_rows()
+        objs = {}
+        for obj_id, row in rows.items():
+            objs[obj_id] = cls(**row.kwargs())
+        records, offset = journal.read(cls._journal_path())
+        cls._replay(objs, records)
+        return objs
+
+    @classmethod
+    def _read_snapshot(cls, partition: int = None) -> dict:
+        """Return the Rows (by ID) of the snapshot of the class,
+        or of one of its partitions.
+        """
+        rows = {}
+        bin_path = cls._snapshot_path(partition, 'binary')
+        file_path = cls._snapshot_path(partition, 'json')
+        binary = path.exists(bin_path)
+        if binary and path.exists(file_path):
+            # both formats only remain if a snapshot was interrupted
+            # before removing the other one: the newer one is current
+            binary = (os.stat(bin_path).st_mtime_ns,
+                      STORAGE_FORMAT == 'binary') > \
+                (os.stat(file_path).st_mtime_ns, STORAGE_FORMAT != 'binary')
+        if binary:
+            rows = dict(snapshot.load(bin_path))
+        elif path.exists(file_path) and STORAGE_CACHE_SIZE > 0:
+            rows = dict(snapshot.load_json(file_path))
+        elif path.exists(file_path):
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    rows[obj_id] = Row(obj_json)
+        return rows
+
+    @classmethod
+    def _replay(cls, objs: dict, records: List[dict], index: bool = False):
+        """Apply journal records to the objects (by ID),
+        and to the indexes if index is set.
+        """
+        for record in records:
+            if record.get('op') == 'save':
+                obj = cls(**record['data'])
+                previous = dict.get(objs, obj.id)
+                if previous is not None:
+                    cls._touch(previous)
+                objs[obj.id] = obj
+                cls._touch(obj)
+                if index:
+                    cls._index_object(obj)
+            elif record.get('op') == 'remove':
+                obj = objs.pop(record['id'], None)
+                if obj is not None:
+                    cls._touch(obj)
+                if index:
+                    cls._unindex_object(record['id'])
+
+    @classmethod
+    def _snapshot_path(cls, partition: int = None,
+                       format: str = None) -> str:
+        """Return the path of the snapshot of the class, or of one of
+        its partitions, in format (STORAGE_FORMAT by default).
+        """
+        name = cls.__name__
+        if partition is not None:
+            name = "{}.{}".format(name, partition)
+        if (format or STORAGE_FORMAT) == 'binary':
+            return ".db_{}.bin".format(name)
+        return ".db_{}.json".format(name)
+
+    @classmethod
+    def _listing(cls) -> Tuple[int, dict]:
+        """Return the mtime of the data directory and the cached
+        listing of the class for it (empty if it changed since).
+        Snapshots are only replaced by a rename or deleted, both of
+        which change the mtime. A listing is only kept once the mtime
+        is LISTING_SETTLE_NS old, beyond its granularity.
+        """
+        mtime = os.stat('.').st_mtime_ns
+        listing = LISTINGS.get(cls.__name__)
+        if listing is None or listing['mtime'] != mtime:
+            listing = {'mtime': mtime}
+            if time.time_ns() - mtime > LISTING_SETTLE_NS:
+                LISTINGS[cls.__name__] = listing
+        return mtime, listing
+
+    @classmethod
+    def _partitions(cls) -> List[int]:
+        """Return the partitions having a snapshot file, oldest first.
+        """
+        mtime, listing = cls._listing()
+        partitions = listing.get('partitions')
+        if partitions is not None:
+            return list(partitions)
+        prefix = ".db_{}.".format(cls.__name__)
+        partitions = set()
+        for name in os.listdir('.'):
+            if not name.startswith(prefix):
+                continue
+            parts = name[len(prefix):].split('.')
+            if len(parts) == 2 and parts[0].isdigit() and \
+                    parts[1] in ('json', 'bin'):
+                partitions.add(int(parts[0]))
+        listing['partitions'] = partitions = sorted(partitions)
+        return list(partitions)
+
+    @classmethod
+    def _partition(cls, value) -> int:
+        """Return the partition of a partition_attribute value: the
+        start of its period of partition_seconds, in seconds since
+        the epoch.
+        """
+        seconds = int((_to_datetime(value, None) -
+                       snapshot.EPOCH).total_seconds())
+        return seconds - seconds % cls.partition_seconds
+
+    @classmethod
+    def _misplaced(cls, rows: dict, partition: int) -> bool:
+        """Check that some Rows read from the file of a partition
+        belong to another one (files partitioned on another attribute).
+        Stored strings are compared as such: they sort like datetimes.
+        """
+        start = snapshot.EPOCH + timedelta(seconds=partition)
+        end = start + timedelta(seconds=cls.partition_seconds)
+        bounds = {
+            datetime: (start, end),
+            str: (start.strftime(TIMESTAMP_FORMAT),
+                  end.strftime(TIMESTAMP_FORMAT)),
+        }
+        for row in rows.values():
+            value = getattr(row, cls.partition_attribute, None)
+            bound = bounds.get(type(value))
+            if bound is None or value < bound[0] or value >= bound[1]:
+                return True
+        return False
+
+    @classmethod
+    def _touch(cls, obj: TypeVar('Base')):
+        """Mark the partition of an object as changed since the last
+        snapshot, and the partition it was indexed in if its
+        partition_attribute changed (a renewed session moves to a
+        later partition).
+        """
+        if not cls.partition_seconds:
             return
+        dirty = DIRTY.get(cls.__name__, set())
+        if dirty is not None:
+            attribute = cls.partition_attribute
+            dirty.add(cls._partition(getattr(obj, attribute)))
+            values = INDEXED_VALUES.get(cls.__name__, {}).get(obj.id)
+            if values is not None and values.get(attribute) is not None:
+                dirty.add(cls._partition(values[attribute]))
+            DIRTY[cls.__name__] = dirty
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _snapshot_signature(cls) -> tuple:
+        """Return the signatures of the snapshot files of the class,
+        cached with the partitions until the data directory changes.
+        """
+        mtime, listing = cls._listing()
+        signature = listing.get('signature')
+        if signature is None:
+            signature = tuple(_file_signature(cls._snapshot_path(p, f))
+                              for p in [None] + cls._partitions()
+                              for f in ('json', 'binary'))
+            listing['signature'] = signature
+        return signature
+
+    @classmethod
+    def _refresh(cls):
+        """With STORAGE_SHARED (always in journal mode), catch up with
+        the writes of the other processes: replay the journal records
+        appended since the last look, or reload the class when its
+        snapshot or journal file was replaced (once the journal reaches
+        JOURNAL_MAX_SIZE). Changes are detected from the files inode,
+        mtime and size. Snapshot signatures are cached until the data
+        directory changes, so an unchanged class costs two stat calls
+        (the directory and the journal) once the directory has been
+        left alone for LISTING_SETTLE_NS; a listing of the directory
+        and a stat per snapshot file before that.
+        """
+        if not STORAGE_SHARED or STORAGE is not None:
+            return
+        s_class = cls.__name__
+        state = SHARED_STATE.get(s_class)
+        journal_sig = _file_signature(cls._journal_path())
+        if state is None or state['snapshot'] != cls._snapshot_signature() \
+                or (journal_sig is None) != (state['journal'] is None) \
+                or (journal_sig is not None and
+                    (journal_sig[0] != state['journal'][0] or
+                     journal_sig[2] < state['offset'])):
+            cls.load_from_file()
+            return
+        if journal_sig is None or journal_sig[2] == state['offset']:
+            return
+        with _class_locks(s_class)[0].writing():
+            records, offset = journal.read(cls._journal_path(),
+                                           state['offset'])
+            cls._detach_iterators()
+            cls._replay(DATA[s_class], records, index=True)
+            state['offset'] = offset
+
+    @classmethod
+    def _writer_lock(cls):
+        """Return the lock taken by writers for the whole
+        read-modify-write, before the class lock: the file lock of the
+        class with STORAGE_SHARED, or the lock of its file writes when
+        they happen under the class lock (synchronous journal).
+        """
+        if STORAGE is not None:
+            return nullcontext()
+        if STORAGE_SHARED or (STORAGE_MODE == 'journal' and
+                              STORAGE_DURABILITY == 'sync'):
+            return _class_locks(cls.__name__)[1]
+        return nullcontext()
 
     @classmethod
     def save_to_file(cls):
-        """Save all objects to file.
+        """Save all objects to file, in STORAGE_FORMAT.
+        The snapshot is written to a temporary file then renamed,
+        and the journal it supersedes is emptied.
+        Objects not built yet are written from their Row.
+        Journal appends wait for the snapshot, so the ones of mutations
+        it already holds are replayed again harmlessly.
+        With partition_seconds, only the partitions changed since the
+        last snapshot are written.
         """
+        if STORAGE is not None:
+            return STORAGE.save_all(cls)
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with _class_locks(s_class)[1]:
+            cls._refresh()
+            dirty = DIRTY.get(s_class)
+            DIRTY[s_class] = set()
+            objs = DATA[s_class]
+            lazy = isinstance(objs, LazyTable)
+            if lazy:
+                written = objs.checkpoint()
+            else:
+                written = dict(dict.items(objs))
+            if cls.partition_seconds:
+                rows = cls._write_partitions(written, dirty, lazy)
+            else:
+                rows = cls._write_snapshot(written, lazy)
+                for partition in cls._partitions():
+                    cls._remove_snapshot(partition)
+            if lazy:
+                objs.rebase(written, rows)
+            journal.truncate(cls._journal_path())
+            state = SHARED_STATE.get(s_class)
+            if state is not None:
+                state['snapshot'] = cls._snapshot_signature()
+                state['journal'] = _file_signature(cls._journal_path())
+                state['offset'] = 0
+
+    @classmethod
+    def drop_partitions(cls, before: datetime) -> int:
+        """Drop the objects whose partition_attribute is before the
+        partition holding `before`: the files of the older partitions
+        are deleted, and their objects leave memory and the indexes.
+        Return the number of objects dropped (O(log n) if none).
+        """
+        if not cls.partition_seconds:
+            return 0
+        cutoff = snapshot.EPOCH + timedelta(seconds=cls._partition(before))
+        if STORAGE is not None:
+            return STORAGE.remove_before(cls, cls.partition_attribute,
+                                         cutoff)
+        s_class = cls.__name__
+        cls._refresh()
+        if INDEXES.get(s_class) is None:
+            cls.build_indexes()
+        with _class_locks(s_class)[0].reading():
+            keys = cls._ordered_index(cls.partition_attribute)
+            if len(keys) == 0 or keys[0][0] >= cutoff:
+                return 0
+        flush()
+        with cls._writer_lock():
+            cls._refresh()
+            with _class_locks(s_class)[0].writing():
+                keys = cls._ordered_index(cls.partition_attribute)
+                count = bisect.bisect_left(keys, (cutoff,))
+                ids = [k[1] for k in keys[:count]]
+                # sorted indexes are rebuilt on their next use
+                ORDERED.pop(s_class, None)
+                cls._detach_iterators()
+                objs = DATA[s_class]
+                for obj_id in ids:
+                    del objs[obj_id]
+                    cls._unindex_object(obj_id)
+            # the journal may hold saves of dropped objects
+            cls.save_to_file()
+            for partition in cls._partitions():
+                if partition < cls._partition(cutoff):
+                    cls._remove_snapshot(partition)
+        return count
+
+    @classmethod
+    def _write_partitions(cls, objs: dict, dirty: set,
+                          rows: bool = False) -> dict:
+        """Write the snapshots of the dirty partitions (all of them if
+        dirty is None) from the objects (by ID), found in the
+        partition_attribute index. Partitions left empty lose their
+        file.
+        With rows, return the Row of each object written.
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            cls.build_indexes()
+        with _class_locks(s_class)[0].reading():
+            keys = cls._ordered_index(cls.partition_attribute)
+            if dirty is None:
+                dirty = set(cls._partitions())
+                dirty.update(cls._partition(k[0]) for k in keys)
+            ids = {}
+            for partition in dirty:
+                start = snapshot.EPOCH + timedelta(seconds=partition)
+                end = start + timedelta(seconds=cls.partition_seconds)
+                lo = bisect.bisect_left(keys, (start,))
+                hi = bisect.bisect_left(keys, (end,))
+                ids[partition] = [k[1] for k in keys[lo:hi]]
+        result = {}
+        for partition, obj_ids in ids.items():
+            part = {k: objs[k] for k in obj_ids if k in objs}
+            if len(part) == 0:
+                cls._remove_snapshot(partition)
+                continue
+            part_rows = cls._write_snapshot(part, rows, partition)
+            if rows:
+                result.update(part_rows)
+        cls._remove_snapshot()
+        return result
+
+    @classmethod
+    def _remove_snapshot(cls, partition: int = None):
+        """Delete the snapshot files of the class, or of one of its
+        partitions.
+        """
+        LISTINGS.pop(cls.__name__, None)
+        for format in ('json', 'binary'):
+            try:
+                os.remove(cls._snapshot_path(partition, format))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def _write_snapshot(cls, objs: dict, rows: bool = False,
+                        partition: int = None) -> dict:
+        """Write the objects (by ID) as the snapshot of the class,
+        or of one of its partitions.
+        The snapshot of the other format, now stale, is deleted.
+        With rows, return the Row of each object in the new snapshot.
+        """
+        LISTINGS.pop(cls.__name__, None)
+        if STORAGE_FORMAT == 'binary':
+            result = snapshot.dump(cls._snapshot_path(partition), objs, rows)
+            stale = cls._snapshot_path(partition, 'json')
+        else:
+            result = snapshot.dump_json(cls._snapshot_path(partition),
+                                        cls._records(objs), rows)
+            stale = cls._snapshot_path(partition, 'binary')
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+        return result
+
+    @classmethod
+    def _records(cls, objs: dict) -> Iterator[Tuple[str, dict]]:
+        """Yield the (ID, stored fields) of the objects (by ID).
+        """
+        for obj_id, obj in objs.items():
+            if type(obj) is Row or type(obj) is snapshot.JSONRow:
+                yield obj_id, obj.kwargs()
+                continue
+            if isinstance(obj, Row):
+                obj = cls(**obj.kwargs())
+            yield obj_id, obj.to_json(True)
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """Return the path of the journal of the class.
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @classmethod
+    def _flush(cls):
+        """Write the pending mutations of the class to disk. They are
+        taken and written under its file lock, so batches reach the
+        journal in order; no other lock is taken.
+        """
+        with _class_locks(cls.__name__)[1]:
+            with PENDING_LOCK:
+                pending = PENDING.pop(cls.__name__, None)
+            if pending is None:
+                return
+            if STORAGE_MODE != 'journal' or cls._append(pending[1]):
+                cls.save_to_file()
+
+    @classmethod
+    def _append(cls, records: List[dict]) -> bool:
+        """Append a batch of mutations of the class to its journal.
+        Return True once the journal exceeds JOURNAL_MAX_SIZE and
+        should be folded into a new snapshot.
+        """
+        with _class_locks(cls.__name__)[1]:
+            state = SHARED_STATE.get(cls.__name__)
+            before = _file_signature(cls._journal_path())
+            size = journal.append(cls._journal_path(), records)
+            if state is not None:
+                # the records are already applied: skip them on refresh
+                # unless the journal holds others not yet replayed
+                if before is None:
+                    state['journal'] = _file_signature(cls._journal_path())
+                    state['offset'] = size
+                elif state['journal'] is not None and \
+                        before[0] == state['journal'][0] and \
+                        before[2] == state['offset']:
+                    state['offset'] = size
+        return size > JOURNAL_MAX_SIZE
+
+    def _persist(self, op: str) -> Callable:
+        """Persist a mutation of the current object according
+        to STORAGE_DURABILITY:
+        - sync: written before returning.
+        - batched: queued, written by the caller reaching
+          FLUSH_MAX_PENDING or by the flusher every FLUSH_INTERVAL.
+        - async: queued, only ever written by the flusher.
+        Called with the write lock held, so records keep the order of
+        the mutations; return the write to run once it is released
+        (see _write).
+        """
+        cls = self.__class__
+        record = {'op': op, 'id': self.id}
+        if op == 'save' and STORAGE_MODE == 'journal':
+            record['data'] = self.to_json(True)
+        if STORAGE_DURABILITY == 'sync':
+            if STORAGE_MODE != 'journal' or cls._append([record]):
+                return cls.save_to_file
+            return None
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        with PENDING_LOCK:
+            records = PENDING.setdefault(cls.__name__, (cls, []))[1]
+            records.append(record)
+            count = len(records)
+        _start_flusher()
+        if count < FLUSH_MAX_PENDING:
+            return None
+        if STORAGE_DURABILITY == 'batched':
+            return cls._flush
+        FLUSH_EVENT.set()
+        return None
+
+    @staticmethod
+    def _write(write: Callable) -> Callable:
+        """Run the write returned by _persist while the writer lock is
+        still held if the mutation only exists in memory until then
+        (file mode: another process taking the file lock first would
+        reload the class without it). Return it otherwise, to run once
+        the writer lock is released.
+        """
+        if write is not None and STORAGE_MODE != 'journal':
+            write()
+            return None
+        return write
 
     def save(self):
         """Save current object.
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.updated_at = _now()
+        self._cache = None
+        if STORAGE is not None:
+            return STORAGE.save(self)
+        with self.__class__._writer_lock():
+            self.__class__._refresh()
+            with _class_locks(s_class)[0].writing():
+                self.__class__._detach_iterators()
+                DATA[s_class][self.id] = self
+                self.__class__._touch(self)
+                self.__class__._index_object(self)
+                write = self._persist('save')
+            write = self._write(write)
+        if write is not None:
+            write()
 
     def remove(self):
         """Remove object.
         """
+        if STORAGE is not None:
+            return STORAGE.remove(self)
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        write = None
+        with self.__class__._writer_lock():
+            self.__class__._refresh()
+            with _class_locks(s_class)[0].writing():
+                if DATA[s_class].get(self.id) is not None:
+                    self.__class__._detach_iterators()
+                    del DATA[s_class][self.id]
+                    self.__class__._unindex_object(self.id)
+                    self.__class__._touch(self)
+                    write = self._persist('remove')
+            write = self._write(write)
+        if write is not None:
+            write()
+
+    @classmethod
+    def build_indexes(cls):
+        """Rebuild the attribute indexes from the loaded objects.
+        Sorted indexes are rebuilt on their next use.
+        """
+        s_class = cls.__name__
+        with _class_locks(s_class)[0].writing():
+            INDEXES[s_class] = {k: {} for k in cls.indexed_attributes}
+            INDEXED_VALUES[s_class] = {}
+            UNSAVED[s_class] = set()
+            ORDERED.pop(s_class, None)
+            # dict.values: objects of a LazyTable are indexed from their Row
+            for obj in dict.values(DATA.get(s_class, {})):
+                cls._index_object(obj)
+
+    @classmethod
+    def _index_object(cls, obj: TypeVar('Base')):
+        """Add (or refresh) the index entries of an object.
+        """
+        if len(cls.indexed_attributes) + len(cls.ordered_attributes) == 0:
+            return
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            cls.build_indexes()
+        values = INDEXED_VALUES[s_class].get(obj.id)
+        # the place of the object in DATA, kept until it is removed
+        if values is not None:
+            values = {'_position': values['_position']}
+        else:
+            values = {'_position': next(POSITIONS)}
+        cls._unindex_object(obj.id)
+        for k in cls.indexed_attributes:
+            v = getattr(obj, k, None)
+            try:
+                INDEXES[s_class][k].setdefault(v, {})[obj.id] = None
+            except TypeError:
+                continue
+            values[k] = v
+        ordered = ORDERED.get(s_class)
+        for k in cls.ordered_attributes:
+            v = getattr(obj, k, None)
+            if v is None:
+                continue
+            values[k] = v
+            if ordered is not None:
+                bisect.insort(ordered[k], (_to_datetime(v, None), obj.id))
+        INDEXED_VALUES[s_class][obj.id] = values
+
+    @classmethod
+    def _unindex_object(cls, obj_id: str):
+        """Drop the index entries of an object.
+        """
+        s_class = cls.__name__
+        UNSAVED.get(s_class, set()).discard(obj_id)
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        ordered = ORDERED.get(s_class)
+        for k, v in values.items():
+            if ordered is not None and k in ordered:
+                keys = ordered[k]
+                key = (_to_datetime(v, None), obj_id)
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+            if k not in INDEXES[s_class]:
+                continue
+            bucket = INDEXES[s_class][k].get(v)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 0:
+                del INDEXES[s_class][k][v]
+
+    @classmethod
+    def _ordered_index(cls, attribute: str) -> List[Tuple[datetime, str]]:
+        """Return the sorted (value, ID) keys of a timestamp attribute
+        of `ordered_attributes`, building them on first use.
+        Called with the class lock held, once the indexes are built.
+        """
+        s_class = cls.__name__
+        ordered = ORDERED.get(s_class)
+        if ordered is None:
+            ordered = {}
+            for k in cls.ordered_attributes:
+                ordered[k] = sorted(
+                    (_to_datetime(values[k], None), obj_id)
+                    for obj_id, values in INDEXED_VALUES[s_class].items()
+                    if k in values)
+            ORDERED[s_class] = ordered
+        return ordered[attribute]
+
+    @classmethod
+    def query(cls, attribute: str = 'created_at', start: datetime = None,
+              end: datetime = None, after: Tuple[datetime, str] = None,
+              reverse: bool = False,
+              limit: int = None) -> List[TypeVar('Base')]:
+        """Return the objects whose timestamp attribute (one of
+        `ordered_attributes`) is in [start, end), ordered by
+        (attribute, ID), descending if reverse, and only those past
+        the key `after` (keyset pagination), at most limit of them.
+        Costs O(log n + k) on the sorted index.
+        """
+        if STORAGE is not None:
+            return STORAGE.query(cls, attribute, start, end, after,
+                                 reverse, limit)
+        s_class = cls.__name__
+        cls._refresh()
+        if INDEXES.get(s_class) is None:
+            cls.build_indexes()
+        with _class_locks(s_class)[0].reading():
+            keys = cls._ordered_index(attribute)
+            lo = 0
+            hi = len(keys)
+            if start is not None:
+                lo = bisect.bisect_left(keys, (start,))
+            if end is not None:
+                hi = bisect.bisect_left(keys, (end,))
+            if after is not None and not reverse:
+                lo = max(lo, bisect.bisect_right(keys, after))
+            if after is not None and reverse:
+                hi = min(hi, bisect.bisect_left(keys, after))
+            if limit is not None and hi - lo > limit:
+                if reverse:
+                    lo = hi - limit
+                else:
+                    hi = lo + limit
+            ids = [k[1] for k in keys[lo:max(lo, hi)]]
+            if reverse:
+                ids.reverse()
+            return [DATA[s_class][obj_id] for obj_id in ids]
+
+    @classmethod
+    def page(cls, limit: int,
+             after: Tuple[datetime, str] = None) -> List[TypeVar('Base')]:
+        """Return up to limit objects ordered by (created_at, ID),
+        starting after the key `after`.
+        """
+        return cls.query('created_at', after=after, limit=limit)
+
+    @classmethod
+    def _index_candidates(cls, attributes: dict) -> List[str]:
+        """Return the IDs matching the most selective indexed
+        attribute of the query, with the objects changed since their
+        save, in DATA order; or None if no index applies.
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            return None
+        candidates = None
+        for k, v in attributes.items():
+            if indexes.get(k) is None:
+                continue
+            try:
+                bucket = indexes[k].get(v, {})
+            except TypeError:
+                continue
+            if candidates is None or len(bucket) < len(candidates):
+                candidates = bucket
+        if candidates is None:
+            return None
+        unsaved = UNSAVED.get(s_class)
+        if unsaved:
+            candidates = candidates.keys() | unsaved
+        if len(candidates) < 2:
+            return list(candidates)
+        values = INDEXED_VALUES[s_class]
+        return sorted(candidates, key=lambda k: values[k]['_position'])
 
     @classmethod
     def count(cls) -> int:
-        """Count all objects.
+        """Count all objects (lock-free: one atomic dict operation).
         """
+        if STORAGE is not None:
+            return STORAGE.count(cls)
+        cls._refresh()
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Return the object cache counters of the class (objects,
+        built objects, cache size, hits and misses), or None when all
+        objects are built at load.
+        """
+        objs = DATA.get(cls.__name__)
+        if not isinstance(objs, LazyTable):
+            return None
+        return objs.stats()
+
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """Return all objects.
@@ -116,22 +1064,118 @@ class Base():
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
-        """Return one object by ID.
+        """Return one object by ID (lock-free: one atomic dict operation).
         """
+        if STORAGE is not None:
+            return STORAGE.get(cls, id)
+        cls._refresh()
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @staticmethod
+    def _matches(obj: TypeVar('Base'), attributes: dict) -> bool:
+        """Check that an object has all the attributes.
+        """
+        for k, v in attributes.items():
+            if (getattr(obj, k) != v):
+                return False
+        return True
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """Search all objects with matching attributes.
         """
+        if STORAGE is not None:
+            return STORAGE.search(cls, attributes)
+        cls._refresh()
         s_class = cls.__name__
         def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
+            return cls._matches(obj, attributes)
+
+        with _class_locks(s_class)[0].reading():
+            objs = DATA[s_class]
+            candidates = cls._index_candidates(attributes)
+            if candidates is not None:
+                objs = {k: objs[k] for k in candidates if k in objs}
+            return list(filter(_search, objs.values()))
+
+    @classmethod
+    def _detach_iterators(cls):
+        """Before objects or index entries of the class are added or
+        removed (class lock held by the writer), read the IDs left to
+        visit by the open iter_search, which go on from that list.
+        """
+        iterators = ITERATORS.get(cls.__name__)
+        if not iterators:
+            return
+        for state in list(iterators.values()):
+            if state['rest'] is None:
+                state['rest'] = list(state['ids'])
+
+    @classmethod
+    def iter_search(cls,
+                    attributes: dict = {}) -> Iterator[TypeVar('Base')]:
+        """Yield the objects with matching attributes one by one.
+        The IDs to visit (the index bucket when one applies, in the
+        order of search) are read ITER_CHUNK at a time under the class
+        lock, and objects as the caller asks for them, without it: the
+        caller may save or remove objects in its loop. The first such
+        write takes the IDs left to visit (_detach_iterators), objects
+        removed meanwhile are skipped and new ones are not visited.
+        """
+        if STORAGE is not None:
+            yield from STORAGE.iter_search(cls, attributes)
+            return
+        cls._refresh()
+        s_class = cls.__name__
+        lock = _class_locks(s_class)[0]
+        with lock.reading():
+            candidates = cls._index_candidates(attributes)
+            if candidates is None:
+                candidates = DATA[s_class]
+            state = {'ids': iter(candidates), 'rest': None}
+            iterators = ITERATORS.setdefault(s_class, {})
+            iterators[id(state)] = state
+        try:
+            ids = None
+            while ids is None or len(ids) == ITER_CHUNK:
+                with lock.reading():
+                    rest = state['rest']
+                    if rest is None:
+                        ids = list(islice(state['ids'], ITER_CHUNK))
+                if rest is not None:
+                    ids = rest
+                for obj_id in ids:
+                    obj = DATA[s_class].get(obj_id)
+                    if obj is not None and cls._matches(obj, attributes):
+                        yield obj
+                if rest is not None:
+                    break
+        finally:
+            iterators.pop(id(state), None)
 
-        return list(filter(_search, DATA[s_class].values()))
+    @classmethod
+    def iter_all(cls) -> Iterator[TypeVar('Base')]:
+        """Yield all objects one by one.
+        """
+        return cls.iter_search()
+
+    @classmethod
+    def first(cls, attributes: dict = {}) -> TypeVar('Base'):
+        """Return the first object with matching attributes, or None,
+        stopping at the first match.
+        """
+        if STORAGE is not None:
+            return next(STORAGE.iter_search(cls, attributes), None)
+        cls._refresh()
+        s_class = cls.__name__
+        with _class_locks(s_class)[0].reading():
+            objs = DATA[s_class]
+            candidates = cls._index_candidates(attributes)
+            if candidates is None:
+                candidates = objs
+            for obj_id in candidates:
+                obj = objs.get(obj_id)
+                if obj is not None and cls._matches(obj, attributes):
+                    return obj
+        return None
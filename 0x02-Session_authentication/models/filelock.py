@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Inter-process file lock module.
+"""
+import fcntl
+import threading
+
+
+class FileLock():
+    """Re-entrant lock shared by the threads of a process and,
+    through flock on a lock file, by every process using that file.
+    """
+
+    def __init__(self, file_path: str):
+        """Initialize a FileLock on a lock file.
+        """
+        self.file_path = file_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> 'FileLock':
+        """Acquire the lock, waiting for the other processes.
+        """
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.file_path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except Exception:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *args):
+        """Release the lock.
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
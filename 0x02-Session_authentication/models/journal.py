@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Append-only journal module.
+"""
+import json
+import os
+from os import path
+from typing import List, Tuple
+
+
+def append(file_path: str, records: List[dict]) -> int:
+    """Append records to the journal in one write
+    and return its new size.
+    """
+    with open(file_path, 'a') as f:
+        f.write("".join(json.dumps(r) + "\n" for r in records))
+        return f.tell()
+
+
+def read(file_path: str, offset: int = 0) -> Tuple[List[dict], int]:
+    """Return the records of the journal written after offset, in
+    write order, and the offset following the last one read.
+    A torn trailing record (interrupted or ongoing write) is left
+    for a later read.
+    """
+    if not path.exists(file_path):
+        return [], offset
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    records = []
+    for line in data.splitlines(True):
+        if not line.endswith(b"\n"):
+            break
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+        offset += len(line)
+    return records, offset
+
+
+def truncate(file_path: str):
+    """Empty the journal once its records are in a snapshot.
+    The journal is replaced by a new empty file, so that readers
+    in other processes notice the change of inode.
+    """
+    if path.exists(file_path):
+        tmp_path = "{}.tmp".format(file_path)
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, file_path)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Lazy object table module.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterator, Tuple
+
+
+class Row():
+    """Snapshot record that is not built into an object yet.
+    Attribute access reads the record so it can be indexed as is.
+    """
+    __slots__ = ('_fields',)
+
+    def __init__(self, fields: dict):
+        """Initialize a Row from the keyword arguments of the object.
+        """
+        self._fields = fields
+
+    def __getattr__(self, name: str):
+        """Read one field of the record.
+        """
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def kwargs(self) -> dict:
+        """Return the keyword arguments building the object.
+        """
+        return self._fields
+
+
+class LazyTable(dict):
+    """Dictionary of objects by ID whose values are built
+    from their Row on first access.
+    With cache_size, it is a cache of built objects: at most that
+    many objects built from a Row stay built, the least recently used
+    one falls back to its Row. Objects set since the last snapshot
+    have no Row yet, so they stay built until the snapshot rows are
+    given back (rebase).
+    It limits the objects built, not memory: every key keeps its Row.
+    """
+
+    def __init__(self, factory: Callable, rows: dict = {},
+                 cache_size: int = 0):
+        """Initialize a LazyTable with the class building the objects.
+        """
+        super().__init__(rows)
+        self._factory = factory
+        self._cache_size = cache_size
+        self._cached = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._built = sum(1 for v in dict.values(self)
+                          if not isinstance(v, Row))
+        self.hits = 0
+        self.misses = 0
+
+    def _stored(self, key: str, value):
+        """Store a value under key, counting the objects built.
+        Called with the lock held.
+        """
+        previous = dict.get(self, key)
+        if previous is not None and not isinstance(previous, Row):
+            self._built -= 1
+        if not isinstance(value, Row):
+            self._built += 1
+        dict.__setitem__(self, key, value)
+
+    def _removed(self, value):
+        """Count out a removed value. Called with the lock held.
+        """
+        if not isinstance(value, Row):
+            self._built -= 1
+
+    def _build(self, key: str, value):
+        """Build (once) and return the object stored under key.
+        """
+        if not isinstance(value, Row):
+            with self._lock:
+                self.hits += 1
+                if key in self._cached:
+                    self._cached.move_to_end(key)
+            return value
+        obj = self._factory(**value.kwargs())
+        with self._lock:
+            self.misses += 1
+            current = dict.get(self, key)
+            if current is not value:
+                # built or replaced by another thread meanwhile
+                if current is None or isinstance(current, Row):
+                    return obj
+                return current
+            self._stored(key, obj)
+            if self._cache_size:
+                self._cached[key] = (value, obj)
+                self._evict()
+        return obj
+
+    def _evict(self):
+        """Turn the least recently used objects back into their Row
+        until cache_size are left. Called with the lock held.
+        """
+        while len(self._cached) > self._cache_size:
+            key, (row, obj) = self._cached.popitem(last=False)
+            if dict.get(self, key) is obj:
+                self._stored(key, row)
+
+    def __getitem__(self, key: str):
+        """Return the object with this ID.
+        """
+        return self._build(key, dict.__getitem__(self, key))
+
+    def __setitem__(self, key: str, value):
+        """Store an object, built until the next rebase.
+        """
+        with self._lock:
+            self._stored(key, value)
+            self._cached.pop(key, None)
+            self._dirty.add(key)
+
+    def __delitem__(self, key: str):
+        """Remove the object with this ID.
+        """
+        with self._lock:
+            self._removed(dict.pop(self, key))
+            self._cached.pop(key, None)
+
+    def get(self, key: str, default=None):
+        """Return the object with this ID, or default.
+        """
+        value = dict.get(self, key)
+        if value is None:
+            return default
+        return self._build(key, value)
+
+    def pop(self, key: str, *args):
+        """Remove and return the object with this ID.
+        """
+        with self._lock:
+            if not dict.__contains__(self, key):
+                return dict.pop(self, key, *args)
+            value = dict.pop(self, key)
+            self._removed(value)
+            self._cached.pop(key, None)
+        if isinstance(value, Row):
+            value = self._factory(**value.kwargs())
+        return value
+
+    def values(self) -> Iterator:
+        """Iterate over the objects, building them as needed.
+        """
+        for key, value in dict.items(self):
+            yield self._build(key, value)
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """Iterate over (ID, object) pairs, building objects as needed.
+        """
+        for key, value in dict.items(self):
+            yield key, self._build(key, value)
+
+    def checkpoint(self) -> dict:
+        """Return the stored values (objects or Rows) by ID, about to
+        be written as a snapshot.
+        """
+        with self._lock:
+            self._dirty.clear()
+            return dict(dict.items(self))
+
+    def rebase(self, written: dict, rows: dict):
+        """Take the Rows of the snapshot written from a checkpoint:
+        objects unchanged since then may fall back to them.
+        """
+        with self._lock:
+            for key, row in rows.items():
+                current = dict.get(self, key)
+                if key in self._dirty or current is not written[key]:
+                    continue
+                if isinstance(current, Row):
+                    dict.__setitem__(self, key, row)
+                elif self._cache_size:
+                    self._cached[key] = (row, current)
+            if self._cache_size:
+                self._evict()
+
+    def built(self) -> int:
+        """Count the objects already built.
+        """
+        return self._built
+
+    def stats(self) -> dict:
+        """Return the cache counters of the table.
+        """
+        return {
+            'size': len(self),
+            'built': self._built,
+            'cache_size': self._cache_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Snapshot module.
+A binary snapshot stores one column (list) per attribute, pickled
+with protocol 4 after a version header, so it stays readable across
+Python versions; datetimes are stored as seconds since the epoch.
+A JSON snapshot is one JSON object holding one object per line,
+so each object can be read back alone from its offset.
+"""
+import json
+import os
+import pickle
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Tuple
+
+from models.lazy import Row
+
+
+MAGIC = b'BDB2'
+PROTOCOL = 4
+EPOCH = datetime(1970, 1, 1)
+
+
+class Unpickler(pickle.Unpickler):
+    """Unpickler of snapshot payloads: containers and scalars only,
+    no class is ever looked up.
+    """
+
+    def find_class(self, module: str, name: str):
+        """Refuse every global.
+        """
+        raise pickle.UnpicklingError(
+            "{}.{} in a snapshot".format(module, name))
+
+
+class ColumnRow(Row):
+    """Row reading its fields from the columns of a snapshot.
+    """
+    __slots__ = ('_index',)
+
+    def __init__(self, payload: dict, index: int):
+        """Initialize a ColumnRow from a snapshot and a row number.
+        """
+        super().__init__(payload)
+        self._index = index
+
+    def __getattr__(self, name: str):
+        """Read one field of the record.
+        """
+        column = self._fields['columns'].get(name)
+        if column is None:
+            raise AttributeError(name)
+        value = column[self._index]
+        if name in self._fields['stamps'] and value is not None:
+            value = EPOCH + timedelta(seconds=value)
+        return value
+
+    def kwargs(self) -> dict:
+        """Return the keyword arguments building the object.
+        """
+        i = self._index
+        result = {k: c[i] for k, c in self._fields['columns'].items()}
+        for k in self._fields['stamps']:
+            if result.get(k) is not None:
+                result[k] = EPOCH + timedelta(seconds=result[k])
+        return result
+
+
+class JSONRow(Row):
+    """Row of a JSON snapshot. Once released, its fields are read
+    back from the snapshot file (kept open) on each access.
+    """
+    __slots__ = ('_file', '_offset', '_length')
+
+    def __init__(self, fields: dict, file, offset: int, length: int):
+        """Initialize a JSONRow from its fields (or None) and its
+        place in a snapshot file.
+        """
+        super().__init__(fields)
+        self._file = file
+        self._offset = offset
+        self._length = length
+
+    def __getattr__(self, name: str):
+        """Read one field of the record.
+        """
+        try:
+            return self.kwargs()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def kwargs(self) -> dict:
+        """Return the keyword arguments building the object.
+        """
+        fields = self._fields
+        if fields is None:
+            data = os.pread(self._file.fileno(), self._length, self._offset)
+            fields = json.loads(data)
+        return fields
+
+    def release(self):
+        """Drop the fields held in memory.
+        """
+        self._fields = None
+
+
+def fields(obj) -> dict:
+    """Return the stored attributes of an object or a Row.
+    """
+    if isinstance(obj, Row):
+        return obj.kwargs()
+    return obj.attributes()
+
+
+def dump(file_path: str, objs: dict, rows: bool = False) -> dict:
+    """Write the objects (by ID) as a binary snapshot,
+    through a temporary file then a rename.
+    With rows, return the ColumnRow of each object in the new snapshot.
+    """
+    ids = list(objs.keys())
+    columns = {}
+    stamps = set()
+    for i, obj in enumerate(objs.values()):
+        for key, value in fields(obj).items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * len(ids)
+            if type(value) is datetime:
+                stamps.add(key)
+                value = int((value - EPOCH).total_seconds())
+            column[i] = value
+
+    payload = {'ids': ids, 'columns': columns, 'stamps': sorted(stamps)}
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        pickle.dump(payload, f, protocol=PROTOCOL)
+    os.replace(tmp_path, file_path)
+    if not rows:
+        return None
+    payload['stamps'] = set(payload['stamps'])
+    return {obj_id: ColumnRow(payload, i) for i, obj_id in enumerate(ids)}
+
+
+def load(file_path: str) -> Iterator[Tuple[str, ColumnRow]]:
+    """Yield (ID, ColumnRow) pairs of a binary snapshot.
+    """
+    with open(file_path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if len(magic) == 0:
+            return
+        if magic != MAGIC:
+            raise ValueError("{} is not a snapshot".format(file_path))
+        payload = Unpickler(f).load()
+    payload['stamps'] = set(payload['stamps'])
+    for i, obj_id in enumerate(payload['ids']):
+        yield obj_id, ColumnRow(payload, i)
+
+
+def dump_json(file_path: str, records: Iterable[Tuple[str, dict]],
+              rows: bool = False) -> dict:
+    """Write (ID, fields) records as a JSON snapshot, through
+    a temporary file then a rename.
+    With rows, return the released JSONRow of each record in the new
+    snapshot.
+    """
+    offsets = {}
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'wb') as f:
+        f.write(b'{')
+        position = 1
+        separator = b'\n'
+        for obj_id, obj_fields in records:
+            key = separator + json.dumps(obj_id).encode() + b': '
+            value = json.dumps(obj_fields).encode()
+            f.write(key + value)
+            offsets[obj_id] = (position + len(key), len(value))
+            position += len(key) + len(value)
+            separator = b',\n'
+        f.write(b'\n}\n')
+    if not rows:
+        os.replace(tmp_path, file_path)
+        return None
+    snapshot = open(tmp_path, 'rb')
+    os.replace(tmp_path, file_path)
+    return {obj_id: JSONRow(None, snapshot, offset, length)
+            for obj_id, (offset, length) in offsets.items()}
+
+
+def load_json(file_path: str) -> Iterator[Tuple[str, Row]]:
+    """Yield (ID, JSONRow) pairs of a JSON snapshot, with their fields.
+    Snapshots not written one object per line yield plain Rows.
+    """
+    f = open(file_path, 'rb')
+    first = f.readline()
+    if first != b'{\n':
+        f.seek(0)
+        objs_json = json.load(f)
+        f.close()
+        for obj_id, obj_json in objs_json.items():
+            yield obj_id, Row(obj_json)
+        return
+    decoder = json.JSONDecoder()
+    position = len(first)
+    for line in f:
+        if line.startswith(b'}'):
+            break
+        obj_id, end = decoder.raw_decode(line.decode())
+        start = end + 2
+        stop = len(line) - (2 if line.endswith(b',\n') else 1)
+        obj_json = json.loads(line[start:stop])
+        # one string for the key and the id read by the indexes
+        obj_id = obj_json.setdefault('id', obj_id)
+        yield obj_id, JSONRow(obj_json, f, position + start, stop - start)
+        position += len(line)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""SQLite storage backend module.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, List, Tuple, TypeVar
+
+from models.storage import Storage
+
+
+SQL_TYPES = (str, int, float, type(None))
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _column_value(value):
+    """Return the value stored in an indexed column.
+    """
+    if type(value) is datetime:
+        return value.strftime(TIMESTAMP_FORMAT)
+    if type(value) in SQL_TYPES:
+        return value
+    return None
+
+
+class SQLiteStorage(Storage):
+    """Storage backend keeping one table per class in a SQLite
+    database in WAL mode. Each object is stored as its JSON form,
+    plus one indexed column per attribute of `indexed_attributes`
+    and `ordered_attributes`.
+    """
+
+    def __init__(self, file_path: str):
+        """Initialize a SQLiteStorage on a database file.
+        """
+        self.file_path = file_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables = set()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _table(self, cls: type) -> str:
+        """Create (once) the table of a class and return its name.
+        """
+        name = cls.__name__
+        if name in self._tables:
+            return name
+        with self._lock:
+            conn = self._connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" ('
+                         'id TEXT PRIMARY KEY, data TEXT NOT NULL)'
+                         .format(name))
+            columns = [r[1] for r in conn.execute(
+                'PRAGMA table_info("{}")'.format(name))]
+            for k in cls.indexed_attributes:
+                if k not in columns:
+                    conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                                 .format(name, k))
+                    columns.append(k)
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                             'ON "{0}"("{1}")'.format(name, k))
+            for k in cls.ordered_attributes:
+                if k not in columns:
+                    conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                                 .format(name, k))
+                    conn.execute('UPDATE "{0}" SET "{1}" = json_extract('
+                                 'data, \'$.{1}\')'.format(name, k))
+                    columns.append(k)
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}_id" '
+                             'ON "{0}"("{1}", id)'.format(name, k))
+            self._tables.add(name)
+        return name
+
+    def load(self, cls: type):
+        """Create the table of a class, importing the objects of its
+        files (snapshot and partitions, JSON or binary, then journal,
+        read as the file storage does) when the table is empty.
+        """
+        self._table(cls)
+        if self.count(cls) > 0:
+            return
+        objs = cls._read_files()
+        if len(objs) == 0:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN')
+        for obj in objs.values():
+            self.save(obj)
+        conn.execute('COMMIT')
+
+    def save_all(self, cls: type):
+        """Checkpoint the WAL into the database file.
+        """
+        self._table(cls)
+        self._connection().execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def save(self, obj: TypeVar('Base')):
+        """Insert or update an object.
+        """
+        cls = obj.__class__
+        table = self._table(cls)
+        columns = ['id', 'data']
+        values = [obj.id, json.dumps(obj.to_json(True))]
+        for k in cls.indexed_attributes + cls.ordered_attributes:
+            if k in columns:
+                continue
+            columns.append(k)
+            values.append(_column_value(getattr(obj, k, None)))
+        self._connection().execute(
+            'INSERT INTO "{}" ({}) VALUES ({}) '
+            'ON CONFLICT(id) DO UPDATE SET {}'.format(
+                table,
+                ', '.join('"{}"'.format(c) for c in columns),
+                ', '.join('?' for c in columns),
+                ', '.join('"{0}" = excluded."{0}"'.format(c)
+                          for c in columns[1:])),
+            values)
+
+    def remove(self, obj: TypeVar('Base')):
+        """Delete an object.
+        """
+        table = self._table(obj.__class__)
+        self._connection().execute(
+            'DELETE FROM "{}" WHERE id = ?'.format(table), (obj.id,))
+
+    def remove_before(self, cls: type, attribute: str,
+                      before: datetime) -> int:
+        """Delete the objects whose timestamp attribute is before
+        `before`, from the (attribute, id) index.
+        """
+        table = self._table(cls)
+        if attribute not in cls.ordered_attributes:
+            raise KeyError(attribute)
+        cursor = self._connection().execute(
+            'DELETE FROM "{}" WHERE "{}" < ?'.format(table, attribute),
+            (_column_value(before),))
+        return cursor.rowcount
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """Return one object by ID, or None.
+        """
+        table = self._table(cls)
+        row = self._connection().execute(
+            'SELECT data FROM "{}" WHERE id = ?'.format(table),
+            (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**json.loads(row[0]))
+
+    def iter_search(self, cls: type,
+                    attributes: dict) -> Iterator[TypeVar('Base')]:
+        """Yield the objects with matching attributes, as the rows
+        are fetched.
+        Indexed attributes are matched in SQL, the others are
+        compared on the loaded objects like the file storage does.
+        """
+        table = self._table(cls)
+        where = []
+        values = []
+        for k, v in attributes.items():
+            if k == 'id' or k in cls.indexed_attributes:
+                if type(v) in SQL_TYPES:
+                    where.append('"{}" IS ?'.format(k))
+                    values.append(v)
+        query = 'SELECT data FROM "{}"'.format(table)
+        if len(where) > 0:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY rowid'
+
+        for row in self._connection().execute(query, values):
+            obj = cls(**json.loads(row[0]))
+            for k, v in attributes.items():
+                if getattr(obj, k) != v:
+                    break
+            else:
+                yield obj
+
+    def query(self, cls: type, attribute: str, start: datetime,
+              end: datetime, after: Tuple[datetime, str], reverse: bool,
+              limit: int) -> List[TypeVar('Base')]:
+        """Return the objects whose timestamp attribute is in
+        [start, end), ordered by (attribute, ID), past the key
+        `after`, from the (attribute, id) index.
+        """
+        table = self._table(cls)
+        if attribute not in cls.ordered_attributes:
+            raise KeyError(attribute)
+        where = []
+        values = []
+        if start is not None:
+            where.append('"{}" >= ?'.format(attribute))
+            values.append(_column_value(start))
+        if end is not None:
+            where.append('"{}" < ?'.format(attribute))
+            values.append(_column_value(end))
+        if after is not None:
+            where.append('("{}", id) {} (?, ?)'.format(
+                attribute, '<' if reverse else '>'))
+            values += [_column_value(after[0]), after[1]]
+        query = 'SELECT data FROM "{}"'.format(table)
+        if len(where) > 0:
+            query += ' WHERE ' + ' AND '.join(where)
+        order = 'DESC' if reverse else 'ASC'
+        query += ' ORDER BY "{0}" {1}, id {1}'.format(attribute, order)
+        if limit is not None:
+            query += ' LIMIT ?'
+            values.append(limit)
+        return [cls(**json.loads(row[0]))
+                for row in self._connection().execute(query, values)]
+
+    def count(self, cls: type) -> int:
+        """Count the objects of a class.
+        """
+        table = self._table(cls)
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(table)).fetchone()[0]
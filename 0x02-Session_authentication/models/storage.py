@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Storage backend module.
+"""
+import os
+from datetime import datetime
+from typing import Iterator, List, Tuple, TypeVar
+
+
+class Storage():
+    """Interface of a storage backend for the Base models.
+    The built-in file storage (DATA and .db_<Class> files) is used
+    when no backend is configured.
+    """
+
+    def load(self, cls: type):
+        """Prepare the storage of a class (Base.load_from_file).
+        """
+        raise NotImplementedError
+
+    def save_all(self, cls: type):
+        """Make every object of a class durable (Base.save_to_file).
+        """
+        raise NotImplementedError
+
+    def save(self, obj: TypeVar('Base')):
+        """Insert or update an object.
+        """
+        raise NotImplementedError
+
+    def remove(self, obj: TypeVar('Base')):
+        """Delete an object.
+        """
+        raise NotImplementedError
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """Return one object by ID, or None.
+        """
+        raise NotImplementedError
+
+    def search(self, cls: type, attributes: dict) -> List[TypeVar('Base')]:
+        """Return the objects with matching attributes.
+        """
+        return list(self.iter_search(cls, attributes))
+
+    def iter_search(self, cls: type,
+                    attributes: dict) -> Iterator[TypeVar('Base')]:
+        """Yield the objects with matching attributes one by one.
+        """
+        raise NotImplementedError
+
+    def query(self, cls: type, attribute: str, start: datetime,
+              end: datetime, after: Tuple[datetime, str], reverse: bool,
+              limit: int) -> List[TypeVar('Base')]:
+        """Return the objects whose timestamp attribute is in
+        [start, end), ordered by (attribute, ID), past the key
+        `after` (see Base.query).
+        """
+        raise NotImplementedError
+
+    def remove_before(self, cls: type, attribute: str,
+                      before: datetime) -> int:
+        """Delete the objects whose timestamp attribute is before
+        `before`, and return how many were deleted.
+        """
+        raise NotImplementedError
+
+    def count(self, cls: type) -> int:
+        """Count the objects of a class.
+        """
+        raise NotImplementedError
+
+
+def load_storage(name: str) -> Storage:
+    """Return the storage backend called name,
+    or None for the built-in file storage.
+    """
+    if name == 'sqlite':
+        from models.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.getenv('SQLITE_PATH', '.db.sqlite3'))
+    return None
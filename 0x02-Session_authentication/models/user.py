@@ -7,6 +7,8 @@ from models.base import Base
 class User(Base):
     """User class for authentication and user management.
     """
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    indexed_attributes = ('email',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a User instance with email, password,
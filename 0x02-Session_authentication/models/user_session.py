@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
 """User session module.
 """
+import os
+
 from models.base import Base
 
 
+try:
+    SESSION_PARTITION = int(os.getenv('SESSION_PARTITION', '0'))
+except Exception:
+    SESSION_PARTITION = 0
+
+
 class UserSession(Base):
     """User session class.
+    Sessions are stored in one snapshot file, or with SESSION_PARTITION
+    (seconds, opt-in) in one partition file per period of updated_at:
+    a session moves to the partition of its last save (creation or
+    renewal), so expired ones are dropped a partition at a time.
     """
+    __slots__ = ('user_id', 'session_id')
+    indexed_attributes = ('session_id', 'user_id')
+    partition_seconds = SESSION_PARTITION
+    partition_attribute = 'updated_at'
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initializes a User session instance.